@@ -0,0 +1,410 @@
+import io
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.read_serializers import RecipeReadSerializer
+from api.renderers import FastJSONRenderer, use_orjson
+from api.serializers import GetRecipeSerializer, PostRecipeSerializer
+from api.shopping_list import SHOPPING_LIST_RENDERERS
+from recipes.feed import fan_out_recipes, get_feed
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import (Ingredient, Recipe, RecipeFavorite,
+                            RecipeIngredient, Tag)
+from users.models import Subscription, User
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Регистрирует бенчмарк под именем функции. Бенчмарк принимает
+    число повторов замера и возвращает строки с результатами."""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def measure(func, repeat):
+    """Возвращает медианное время выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def create_users(count, prefix='benchmark'):
+    return User.objects.bulk_create(
+        User(
+            email=f'{prefix}{number}@example.com',
+            username=f'{prefix}{number}',
+            first_name='Имя',
+            last_name='Фамилия'
+        )
+        for number in range(count)
+    )
+
+
+def create_tags(count):
+    return Tag.objects.bulk_create(
+        Tag(
+            name=f'Бенчмарк {number}',
+            color=f'#{number:06X}',
+            slug=f'benchmark-{number}'
+        )
+        for number in range(count)
+    )
+
+
+def create_ingredients(count, prefix='бенчмарк'):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'{prefix} {number:06}', measurement_unit='г')
+        for number in range(count)
+    )
+
+
+def create_recipes(authors, count, ingredients, tags, per_recipe=8):
+    """Создает count рецептов авторов authors по per_recipe ингредиентов
+    и по одному-три тега в каждом."""
+    recipes = Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание рецепта ' * 20,
+                cooking_time=number % 120 + 1
+            )
+            for number in range(count)
+        ),
+        batch_size=1000
+    )
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (number * per_recipe + shift) % len(ingredients)
+                ],
+                amount=shift + 1
+            )
+            for number, recipe in enumerate(recipes)
+            for shift in range(per_recipe)
+        ),
+        batch_size=1000
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for number, recipe in enumerate(recipes)
+            for tag in tags[:number % len(tags) + 1]
+        ),
+        batch_size=1000
+    )
+    return recipes
+
+
+def get_context(user):
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = user
+    return {'request': request}
+
+
+@benchmark
+def read_serializer(repeat):
+    """Сравнивает пропускную способность GetRecipeSerializer и
+    RecipeReadSerializer на страницах из 6, 50 и 200 рецептов."""
+    authors = create_users(20)
+    reader = authors[0]
+    recipes = create_recipes(
+        authors, 200, create_ingredients(500), create_tags(3)
+    )
+    RecipeFavorite.objects.bulk_create(
+        RecipeFavorite(user=reader, recipe=recipe) for recipe in recipes[::3]
+    )
+    for user in (AnonymousUser(), reader):
+        for size in (6, 50, 200):
+            page = list(
+                Recipe.objects.with_related().order_by('-id')[:size]
+            )
+            for serializer in (GetRecipeSerializer, RecipeReadSerializer):
+                elapsed = measure(
+                    lambda: serializer(
+                        page, many=True, context=get_context(user)
+                    ).data,
+                    repeat
+                )
+                yield (
+                    f'{serializer.__name__}, '
+                    f'{"аноним" if user.is_anonymous else "пользователь"}, '
+                    f'{size} рецептов: {elapsed:.2f} мс, '
+                    f'{size / elapsed * 1000:.0f} рецептов в секунду'
+                )
+
+
+@benchmark
+def feed(repeat):
+    """Рассылает 10000 рецептов 300 авторов подписчикам и сравнивает
+    чтение ленты с выборкой рецептов по подпискам через JOIN."""
+    authors = create_users(300, prefix='author')
+    readers = create_users(20, prefix='reader')
+    Subscription.objects.bulk_create(
+        Subscription(user=reader, author=author)
+        for reader in readers
+        for author in authors
+    )
+    # Первые пять авторов популярны: их рецепты подмешиваются при чтении.
+    User.objects.filter(id__in=[author.id for author in authors]).update(
+        followers_count=len(readers)
+    )
+    User.objects.filter(id__in=[author.id for author in authors[:5]]).update(
+        followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS + 1
+    )
+    recipes = create_recipes(
+        authors, 10000, create_ingredients(100), create_tags(3), per_recipe=1
+    )
+    started = time.perf_counter()
+    fan_out_recipes([recipe.id for recipe in recipes])
+    yield (
+        f'Рассылка {len(recipes)} рецептов {len(readers)} подписчикам: '
+        f'{time.perf_counter() - started:.2f} с'
+    )
+    reader = readers[0]
+    elapsed = measure(lambda: get_feed(reader), repeat)
+    yield f'Лента из {settings.FEED_MAX_ITEMS} рецептов: {elapsed:.2f} мс'
+    elapsed = measure(
+        lambda: list(
+            Recipe.objects.filter(
+                author__following__user=reader
+            ).order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )[:settings.FEED_MAX_ITEMS]
+        ),
+        repeat
+    )
+    yield f'Выборка через JOIN по подпискам: {elapsed:.2f} мс'
+
+
+# Индексы миграции recipes.0003 и выборки, которые они ускоряют.
+ACCESS_PATTERN_INDEXES = (
+    'recipe_pub_date_idx',
+    'recipe_author_pub_date_idx',
+    'ingredient_name_upper_idx',
+)
+
+
+def get_access_pattern_queries(author):
+    return {
+        'Лента рецептов': Recipe.objects.order_by('-pub_date')[:6],
+        'Рецепты автора': Recipe.objects.filter(
+            author=author
+        ).order_by('-pub_date')[:6],
+        'Поиск ингредиента по началу названия': Ingredient.objects.filter(
+            name__istartswith='бенчмарк 0123'
+        )[:10],
+    }
+
+
+def explain_queries(queries, repeat):
+    for title, queryset in queries.items():
+        elapsed = measure(lambda: list(queryset.all()), repeat)
+        yield f'{title}: {elapsed:.2f} мс'
+        for line in queryset.explain().splitlines():
+            yield f'    {line}'
+
+
+@benchmark
+def access_pattern_indexes(repeat):
+    """Показывает планы и время выборок с индексами миграции
+    recipes.0003 и без них."""
+    authors = create_users(100)
+    create_recipes(authors, 20000, create_ingredients(20000), create_tags(3))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    queries = get_access_pattern_queries(authors[0])
+    yield 'С индексами:'
+    yield from explain_queries(queries, repeat)
+    with connection.cursor() as cursor:
+        for index in ACCESS_PATTERN_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute('ANALYZE')
+    yield 'Без индексов:'
+    yield from explain_queries(queries, repeat)
+
+
+def rewrite_ingredients(recipe, ingredients):
+    """Прежнее обновление состава: удалить все строки и создать заново."""
+    RecipeIngredient.objects.filter(recipe=recipe).delete()
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredient['id'],
+            amount=ingredient['amount']
+        )
+        for ingredient in ingredients
+    )
+
+
+def get_composition_changes(ingredient_ids):
+    """Пары составов рецепта: исходный и измененный."""
+    original = [
+        {'id': ingredient_id, 'amount': 100}
+        for ingredient_id in ingredient_ids[:20]
+    ]
+    new_amount = [dict(original[0], amount=200), *original[1:]]
+    replaced = [*original[:-1], {'id': ingredient_ids[20], 'amount': 100}]
+    all_new = [
+        {'id': ingredient_id, 'amount': 100}
+        for ingredient_id in ingredient_ids[20:40]
+    ]
+    return original, {
+        'изменено количество одного ингредиента': new_amount,
+        'заменен один ингредиент': replaced,
+        'заменены все ингредиенты': all_new,
+    }
+
+
+@benchmark
+def recipe_update(repeat):
+    """Сравнивает обновление состава рецепта из 20 ингредиентов по
+    разнице с удалением и созданием всех строк."""
+    author = create_users(1)[0]
+    ingredient_ids = [
+        ingredient.id for ingredient in create_ingredients(40)
+    ]
+    recipe = create_recipes([author], 1, [], create_tags(1), per_recipe=0)[0]
+    original, changes = get_composition_changes(ingredient_ids)
+    serializer = PostRecipeSerializer()
+    for title, changed in changes.items():
+        compositions = [original, changed]
+
+        def update_by_diff():
+            compositions.reverse()
+            serializer.update_ingredients(
+                Recipe.objects.prefetch_related('ingredient').get(
+                    id=recipe.id
+                ),
+                compositions[0]
+            )
+
+        rewrite_ingredients(recipe, original)
+        with CaptureQueriesContext(connection) as context:
+            update_by_diff()
+            update_by_diff()
+        writes = sum(
+            query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            for query in context.captured_queries
+        ) // 2
+        by_diff = measure(update_by_diff, repeat)
+        by_rewrite = measure(
+            lambda: rewrite_ingredients(
+                recipe, compositions.reverse() or compositions[0]
+            ),
+            repeat
+        )
+        old_ids = {item['id']: item['amount'] for item in original}
+        new_ids = {item['id']: item['amount'] for item in changed}
+        rows = sum(
+            old_ids.get(ingredient_id) != new_ids.get(ingredient_id)
+            for ingredient_id in old_ids.keys() | new_ids.keys()
+        )
+        yield (
+            f'{title}: по разнице {by_diff:.2f} мс, запросов записи: '
+            f'{writes}, строк: {rows}; удаление и создание '
+            f'{by_rewrite:.2f} мс, запросов записи: 2, '
+            f'строк: {len(original) + len(changed)}'
+        )
+
+
+def get_shopping_list(size):
+    return [
+        (f'Ингредиент {number:04}', 'г', number * 10)
+        for number in range(size)
+    ]
+
+
+@benchmark
+def shopping_list_formats(repeat):
+    """Время, пиковая память и размер выгрузки списка покупок из 10, 100
+    и 1000 ингредиентов в каждом формате."""
+    for size in (10, 100, 1000):
+        shopping_list = get_shopping_list(size)
+        for renderer_class in SHOPPING_LIST_RENDERERS:
+            renderer = renderer_class()
+            elapsed = measure(
+                lambda: renderer.render_shopping_list(
+                    shopping_list, io.BytesIO()
+                ),
+                repeat
+            )
+            file = io.BytesIO()
+            tracemalloc.start()
+            renderer.render_shopping_list(shopping_list, file)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            yield (
+                f'{renderer.format}, {size} ингредиентов: {elapsed:.2f} мс, '
+                f'пик памяти {peak / 1024:.0f} КБ, '
+                f'размер {len(file.getvalue()) / 1024:.1f} КБ'
+            )
+
+
+@benchmark
+def ingredient_index(repeat):
+    """Сравнивает подсказки ингредиентов из индекса в памяти с запросом
+    istartswith к базе данных на 20000 ингредиентов."""
+    create_ingredients(20000)
+    index = IngredientIndex()
+    index.search('', 1)
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    for query in ('б', 'бенчмарк 0123', 'бенчмарк 01234', 'нет такого'):
+        from_index = measure(lambda: index.search(query, limit), repeat)
+        from_database = measure(
+            lambda: list(
+                Ingredient.objects.filter(
+                    name__istartswith=query
+                ).values('id', 'name', 'measurement_unit')[:limit]
+            ),
+            repeat
+        )
+        yield (
+            f'"{query}": индекс {from_index * 1000:.0f} мкс, '
+            f'база данных {from_database * 1000:.0f} мкс'
+        )
+
+
+@benchmark
+def json_renderer(repeat):
+    """Сравнивает скорость FastJSONRenderer и стандартного рендерера DRF
+    на странице из 200 рецептов."""
+    if not use_orjson():
+        yield 'orjson не установлен или отключен настройкой FAST_JSON'
+        return
+    authors = create_users(20)
+    create_recipes(authors, 200, create_ingredients(500), create_tags(3))
+    data = {
+        'count': 200,
+        'next': None,
+        'previous': None,
+        'results': RecipeReadSerializer(
+            Recipe.objects.with_related()[:200],
+            many=True,
+            context=get_context(AnonymousUser())
+        ).data,
+    }
+    for renderer in (JSONRenderer(), FastJSONRenderer()):
+        size = len(renderer.render(data, 'application/json', {}))
+        elapsed = measure(
+            lambda: renderer.render(data, 'application/json', {}), repeat
+        )
+        yield (
+            f'{type(renderer).__name__}: {elapsed:.2f} мс, '
+            f'{size / elapsed * 1000 / 1024 / 1024:.1f} МБ/с'
+        )
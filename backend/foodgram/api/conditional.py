@@ -0,0 +1,59 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from recipes.user_state import get_user_state
+from recipes.versions import get_table_version
+
+
+class ConditionalGetMixin:
+    """Вычисляет ETag и Last-Modified по версиям наборов данных.
+
+    version_tables - наборы данных, от которых зависит ответ;
+    user_dependent - зависит ли ответ от избранного, корзины и подписок
+    пользователя. Время их изменения не хранится, поэтому такие ответы
+    авторизованным пользователям проверяются только по ETag.
+    """
+    version_tables = ()
+    user_dependent = False
+
+    def get_versions(self, request):
+        return [get_table_version(table) for table in self.version_tables]
+
+    def get_validators(self, request):
+        versions = self.get_versions(request)
+        parts = [request.get_full_path()]
+        parts.extend(token for token, _ in versions)
+        if self.user_dependent:
+            state = get_user_state(request)
+            parts.append(str(request.user.id))
+            parts.extend(
+                ','.join(map(str, sorted(ids))) for ids in state
+            )
+        etag = hashlib.md5('|'.join(parts).encode()).hexdigest()
+        if self.user_dependent and request.user.is_authenticated:
+            return quote_etag(etag), None
+        return quote_etag(etag), max(modified for _, modified in versions)
+
+
+def conditional_get(method):
+    """Отвечает 304 Not Modified, если данные не менялись с прошлого
+    запроса клиента, не выполняя сериализацию."""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            if self.user_dependent:
+                patch_vary_headers(response, ('Authorization', ))
+        return response
+    return wrapper
@@ -0,0 +1,116 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.shopping_list import SHOPPING_LIST_RENDERERS, get_shopping_list
+from recipes.models import ExportJob
+
+RENDERERS = {renderer.format: renderer for renderer in SHOPPING_LIST_RENDERERS}
+ABANDONED_ERROR = 'Обработчик выгрузки прервался'
+
+
+def needs_export_job(renderer, shopping_list):
+    """Нужно ли выгружать список покупок в фоне, а не в ответе на
+    запрос: для медленных форматов и больших списков."""
+    return (
+        renderer.format not in settings.SHOPPING_LIST_SYNC_FORMATS
+        or len(shopping_list) > settings.SHOPPING_LIST_SYNC_MAX_ITEMS
+    )
+
+
+def claim_export_job():
+    """Забирает из очереди готовую к запуску задачу и помечает ее
+    выполняемой.
+
+    Задачи, которые выполняются дольше EXPORT_JOB_LEASE секунд, считаются
+    брошенными упавшим обработчиком: они забираются снова, а исчерпавшие
+    попытки помечаются ошибочными. Блокировка строки с skip_locked
+    позволяет запускать несколько обработчиков одновременно.
+    """
+    now = timezone.now()
+    abandoned = Q(
+        status=ExportJob.RUNNING,
+        updated__lt=now - timedelta(seconds=settings.EXPORT_JOB_LEASE)
+    )
+    with transaction.atomic():
+        ExportJob.objects.filter(
+            abandoned, attempts__gte=settings.EXPORT_JOB_MAX_ATTEMPTS
+        ).update(status=ExportJob.FAILED, error=ABANDONED_ERROR, updated=now)
+        job = ExportJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=ExportJob.PENDING, run_after__lte=now) | abandoned
+        ).order_by('run_after').first()
+        if job is None:
+            return None
+        job.status = ExportJob.RUNNING
+        job.attempts += 1
+        job.save(update_fields=('status', 'attempts', 'updated'))
+    return job
+
+
+def run_export_job(job):
+    renderer = RENDERERS[job.format]()
+    try:
+        shopping_list = get_shopping_list(job.user)
+        with renderer.get_file(shopping_list) as file:
+            job.file.save(
+                f'{uuid.uuid4().hex}.{renderer.format}',
+                File(file),
+                save=False
+            )
+        job.status = ExportJob.DONE
+        job.error = ''
+    except Exception as error:
+        job.error = str(error)
+        if job.attempts < settings.EXPORT_JOB_MAX_ATTEMPTS:
+            job.status = ExportJob.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.EXPORT_JOB_RETRY_DELAY
+                * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = ExportJob.FAILED
+    job.save()
+    return job
+
+
+def expire_export_jobs():
+    """Удаляет устаревшие задачи вместе с файлами и кэш пдф.
+
+    Выполняемая задача обновляется не реже раза в EXPORT_JOB_LEASE
+    секунд, поэтому давно не обновлявшаяся брошена и тоже удаляется.
+    """
+    expired_before = timezone.now() - timedelta(
+        seconds=settings.EXPORT_JOB_TTL
+    )
+    expired = ExportJob.objects.filter(updated__lt=expired_before)
+    for job in expired.exclude(file=''):
+        job.file.delete(save=False)
+    expired.delete()
+    cache_dir = settings.SHOPPING_LIST_CACHE_DIR
+    if cache_dir.exists():
+        for path in cache_dir.iterdir():
+            if path.stat().st_mtime < expired_before.timestamp():
+                path.unlink(missing_ok=True)
+
+
+def process_export_jobs(interval, once=False):
+    """Обрабатывает готовые к запуску задачи, пока они не закончатся,
+    затем чистит устаревшие файлы и ждет interval секунд. Повторы
+    упавших задач откладываются, поэтому попадают в следующие проходы."""
+    while True:
+        processed = 0
+        while (job := claim_export_job()) is not None:
+            run_export_job(job)
+            processed += 1
+        expire_export_jobs()
+        if once:
+            return processed
+        time.sleep(interval)
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from api.filters import orders_by_counts, orders_by_score
+from recipes.versions import (COUNTS, RECIPES, get_scores_version,
+                              get_table_version)
+
+
+class ResponseCache:
+    """Ограниченный по размеру LRU-кэш ответов в памяти процесса."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0,
+            }
+
+
+feed_cache = ResponseCache(settings.FEED_CACHE_SIZE)
+
+
+def get_cache_key(request):
+    """Ключ из поколения рецептов, пути и параметров запроса без учета их
+    порядка и пустых значений. Для сортировки по рейтингу или счетчикам в
+    ключ входит и их версия."""
+    params = tuple(
+        (name, tuple(sorted(value for value in values if value)))
+        for name, values in sorted(request.query_params.lists())
+        if any(values)
+    )
+    generation, _ = get_table_version(RECIPES)
+    if orders_by_score(request.query_params):
+        generation += get_scores_version()[0]
+    if orders_by_counts(request.query_params):
+        generation += get_table_version(COUNTS)[0]
+    return generation, request.get_host(), request.path, params
+
+
+def cache_anonymous_response(method):
+    """Кэширует ответы анонимным пользователям: для них флаги избранного,
+    корзины и подписок всегда ложны, и ответ зависит только от запроса.
+    Любое изменение рецептов меняет поколение и тем самым ключи."""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+        key = get_cache_key(request)
+        data = feed_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            feed_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
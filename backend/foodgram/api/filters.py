@@ -1,9 +1,37 @@
 import django_filters
+from django.db.models import F
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 from users.models import User
 
 
+# Рейтинги из RecipeScore, по которым рецепты сортируются по убыванию.
+SCORE_ORDERINGS = {
+    'popular': 'score__popular',
+    'trending': 'score__trending',
+}
+# Счетчики рецептов, которые меняются без изменения версии рецептов.
+COUNT_ORDERINGS = ('favorites_count', 'carts_count')
+
+
+def get_ordering_fields(query_params):
+    return {
+        field.strip().lstrip('-')
+        for field in query_params.get('ordering', '').split(',')
+    }
+
+
+def orders_by_score(query_params):
+    """Сортируется ли список по рейтингам рецептов."""
+    return not get_ordering_fields(query_params).isdisjoint(SCORE_ORDERINGS)
+
+
+def orders_by_counts(query_params):
+    """Сортируется ли список по счетчикам избранного или корзин."""
+    return not get_ordering_fields(query_params).isdisjoint(COUNT_ORDERINGS)
+
+
 class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.NumberFilter(
         label='В избранных',
@@ -22,11 +50,36 @@ class RecipeFilter(django_filters.FilterSet):
         queryset=Tag.objects.all()
 
     )
+    search = django_filters.CharFilter(
+        label='Поиск',
+        method='filter_search'
+    )
+    ordering = django_filters.OrderingFilter(
+        fields=(
+            'pub_date', *COUNT_ORDERINGS, *SCORE_ORDERINGS
+        ),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'author', 'is_in_shopping_cart', 'tags')
 
+    def filter_ordering(self, queryset, name, value):
+        if not value:
+            return queryset
+        ordering = [
+            F(SCORE_ORDERINGS[field.lstrip('-')]).desc(nulls_last=True)
+            if field.lstrip('-') in SCORE_ORDERINGS else field
+            for field in value
+        ]
+        return queryset.order_by(*ordering, '-pub_date', '-id')
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = ('Запускает бенчмарки на сгенерированных данных. Данные '
+            'создаются в транзакции, которая затем откатывается')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            choices=sorted(BENCHMARKS),
+            help='Бенчмарки для запуска, по умолчанию все'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Число повторов каждого замера'
+        )
+
+    def handle(self, *args, **options):
+        for name in options['names'] or sorted(BENCHMARKS):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            with transaction.atomic():
+                for line in BENCHMARKS[name](options['repeat']):
+                    self.stdout.write(line)
+                transaction.set_rollback(True)
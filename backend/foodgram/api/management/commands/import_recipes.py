@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.recipe_import import BATCH_SIZE, import_recipes
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Загружает рецепты из файла в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Почта автора загружаемых рецептов'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество рецептов, сохраняемых за раз'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f'Автор не найден: {options["author"]}')
+        started = time.monotonic()
+        created = 0
+        failed = 0
+        with open(options['path'], encoding='utf-8') as file:
+            for result in import_recipes(
+                file, author, options['batch_size']
+            ):
+                if 'id' in result:
+                    created += 1
+                    continue
+                failed += 1
+                self.stderr.write(
+                    f'Строка {result["line"]}: {result["errors"]}'
+                )
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано рецептов: {created}, с ошибками: {failed} '
+            f'за {elapsed:.1f} с ({created / elapsed:.0f} в секунду)'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.exports import process_export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь выгрузок списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза между проверками очереди, в секундах'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь один раз и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        processed = process_export_jobs(
+            options['interval'], once=options['once']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано выгрузок: {processed}')
+        )
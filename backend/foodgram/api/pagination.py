@@ -1,6 +1,75 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор, который для больших таблиц PostgreSQL без фильтров берет
+    оценку числа строк из pg_class вместо COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        threshold = settings.APPROXIMATE_COUNT_THRESHOLD
+        queryset = self.object_list
+        if threshold is None or not isinstance(queryset, QuerySet):
+            return super().count
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return super().count
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < threshold:
+            return super().count
+        return int(row[0])
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
 
 
 class PageLimitPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением на курсорную.
+
+    Курсорная пагинация включается параметром ?pagination=cursor и
+    поддерживается вьюсетами с атрибутом cursor_ordering. Списки, уже
+    собранные в памяти, и выборки с явно заданной сортировкой (по
+    рейтингу, релевантности поиска, счетчикам) всегда разбиваются на
+    страницы по номеру, чтобы курсор не подменил их сортировку.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+    cursor_paginator = None
+
+    def use_cursor(self, queryset, request, view):
+        if not getattr(view, 'cursor_ordering', None):
+            return False
+        if not isinstance(queryset, QuerySet) or queryset.query.order_by:
+            return False
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(queryset, request, view):
+            self.cursor_paginator = KeysetPagination()
+            self.cursor_paginator.ordering = view.cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
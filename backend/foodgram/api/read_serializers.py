@@ -0,0 +1,77 @@
+from recipes.user_state import get_user_state
+
+
+def get_image_url(image, request):
+    if not image:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(image.url)
+    return image.url
+
+
+def serialize_user(user, state):
+    return {
+        'email': user.email,
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_subscribed': user.id in state.following,
+    }
+
+
+def serialize_tag(tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'slug': tag.slug,
+    }
+
+
+def serialize_recipe(recipe, request, state):
+    return {
+        'id': recipe.id,
+        'tags': [serialize_tag(tag) for tag in recipe.tags.all()],
+        'author': serialize_user(recipe.author, state),
+        'ingredients': [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount
+            }
+            for item in recipe.ingredient.all()
+        ],
+        'is_favorited': recipe.id in state.favorites,
+        'is_in_shopping_cart': recipe.id in state.carts,
+        'name': recipe.name,
+        'image': get_image_url(recipe.feed_image, request),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+class RecipeReadSerializer:
+    """Сериализатор рецептов только для чтения.
+
+    Собирает словари напрямую из рецептов, загруженных через
+    Recipe.objects.with_related(), без создания полей DRF для каждого
+    объекта. Результат совпадает с GetRecipeSerializer.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        state = get_user_state(request)
+        if self.many:
+            return [
+                serialize_recipe(recipe, request, state)
+                for recipe in self.instance
+            ]
+        return serialize_recipe(self.instance, request, state)
@@ -0,0 +1,136 @@
+import json
+from itertools import islice
+from operator import itemgetter
+
+from django.db import transaction
+
+from api.serializers import RecipeImportSerializer
+from recipes.counters import change_counter
+from recipes.feed import fan_out_recipes, schedule_feed_update
+from recipes.images import schedule_recipe_image
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipes_updated
+from users.models import User
+
+BATCH_SIZE = 500  # Количество рецептов, проверяемых и сохраняемых за раз
+
+
+def parse_lines(lines):
+    """Разбирает строки JSON Lines в (номер строки, рецепт, ошибки)."""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, {
+                'non_field_errors': [f'Некорректный JSON: {error}']
+            }
+            continue
+        if not isinstance(item, dict):
+            yield line_number, None, {
+                'non_field_errors': ['Рецепт должен быть JSON-объектом']
+            }
+            continue
+        yield line_number, item, None
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_context(items):
+    """Загружает теги и ингредиенты всей пачки двумя запросами."""
+    tag_ids = set()
+    ingredient_ids = set()
+    for item in items:
+        tags = item.get('tags')
+        if isinstance(tags, list):
+            tag_ids.update(to_int(tag) for tag in tags)
+        ingredients = item.get('ingredients')
+        if isinstance(ingredients, list):
+            ingredient_ids.update(
+                to_int(ingredient.get('id')) for ingredient in ingredients
+                if isinstance(ingredient, dict)
+            )
+    tag_ids.discard(None)
+    ingredient_ids.discard(None)
+    return {
+        'tags': Tag.objects.in_bulk(tag_ids),
+        'ingredient_ids': set(
+            Ingredient.objects.filter(
+                id__in=ingredient_ids
+            ).values_list('id', flat=True)
+        ),
+    }
+
+
+@transaction.atomic
+def save_batch(author, recipes_data):
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=data.get('image')
+        )
+        for data in recipes_data
+    )
+    RecipeTag = Recipe.tags.through
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe, data in zip(recipes, recipes_data)
+        for tag in data['tags']
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe_id=recipe.id,
+            ingredient_id=ingredient.get('id'),
+            amount=ingredient.get('amount')
+        )
+        for recipe, data in zip(recipes, recipes_data)
+        for ingredient in data['ingredients']
+    )
+    change_counter(User, author.id, 'recipes_count', len(recipes))
+    recipes_updated.send(
+        sender=Recipe, recipe_ids=[recipe.id for recipe in recipes]
+    )
+    schedule_feed_update(fan_out_recipes, [recipe.id for recipe in recipes])
+    for recipe in recipes:
+        if recipe.image:
+            schedule_recipe_image(recipe.id)
+    return recipes
+
+
+def import_recipes(lines, author, batch_size=BATCH_SIZE):
+    """Загружает рецепты из строк JSON Lines пачками.
+
+    Для каждой строки возвращает словарь с номером строки и либо id
+    созданного рецепта, либо ошибками проверки.
+    """
+    parsed = parse_lines(lines)
+    while batch := list(islice(parsed, batch_size)):
+        context = load_context(
+            item for _, item, _ in batch if item is not None
+        )
+        results = []
+        valid = []
+        for line_number, item, errors in batch:
+            if errors is None:
+                serializer = RecipeImportSerializer(data=item, context=context)
+                if serializer.is_valid():
+                    valid.append((line_number, serializer.validated_data))
+                    continue
+                errors = serializer.errors
+            results.append({'line': line_number, 'errors': errors})
+        if valid:
+            recipes = save_batch(author, [data for _, data in valid])
+            results.extend(
+                {'line': line_number, 'id': recipe.id}
+                for (line_number, _), recipe in zip(valid, recipes)
+            )
+        yield from sorted(results, key=itemgetter('line'))
@@ -1,14 +1,28 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from django.db.models import F
+from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.models import (Ingredient, Recipe, RecipeFavorite,
-                            RecipeIngredient, ShoppingCart, Tag)
+from api.shopping_list import SHOPPING_LIST_RENDERERS
+from recipes.models import (ExportJob, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from recipes.signals import recipes_updated
+from recipes.user_state import get_user_state
 from users.models import Subscription, User
 
 
+def get_duplicates(ids):
+    return [item_id for item_id, count in Counter(ids).items() if count > 1]
+
+
+def format_ids(ids):
+    return ', '.join(str(item_id) for item_id in sorted(ids))
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
@@ -28,10 +42,9 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_user_state(self.context.get('request')).following
 
     def create(self, validated_data):
         return User.objects.create_user(**validated_data)
@@ -75,9 +88,9 @@ class PasswordSerializer(serializers.ModelSerializer):
 
 
 class SubscriptionRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(
-        max_length=None,
-        use_url=True
+    image = serializers.ImageField(
+        source='card_image',
+        read_only=True
     )
 
     class Meta:
@@ -87,7 +100,6 @@ class SubscriptionRecipeSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -100,7 +112,8 @@ class SubscriptionSerializer(UserSerializer):
             'recipes',
             'recipes_count'
         )
-        read_only_fields = ('email', 'username', 'first_name', 'last_name')
+        read_only_fields = ('email', 'username', 'first_name', 'last_name',
+                            'recipes_count')
 
     def validate(self, attrs):
         user = self.context['request'].user
@@ -123,15 +136,16 @@ class SubscriptionSerializer(UserSerializer):
         return attrs
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'latest_recipes'):
+            return SubscriptionRecipeSerializer(
+                obj.latest_recipes, many=True
+            ).data
         limit = self.context.get('request').query_params.get('recipes_limit')
         recipes = obj.recipes.all()
         if limit:
             recipes = obj.recipes.all()[:int(limit)]
         return SubscriptionRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class TagSerializer(serializers.ModelSerializer):
 
@@ -156,9 +170,9 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     ingredients = serializers.SerializerMethodField()
-    image = Base64ImageField(
-        max_length=None,
-        use_url=True
+    image = serializers.ImageField(
+        source='feed_image',
+        read_only=True
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -170,28 +184,33 @@ class GetRecipeSerializer(serializers.ModelSerializer):
                   'cooking_time')
 
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipe__amount')
-        )
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount
+            }
+            for item in obj.ingredient.all()
+        ]
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return RecipeFavorite.objects.filter(
-            user=user, recipe=obj
-        ).exists()
+        return obj.id in get_user_state(self.context.get('request')).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            user=user, recipe=obj
-        ).exists()
+        return obj.id in get_user_state(self.context.get('request')).carts
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+    coverage = serializers.IntegerField(
+        min_value=1,
+        max_value=100,
+        default=settings.PANTRY_MIN_COVERAGE
+    )
 
 
 class IngredientsRecipePostSerializer(serializers.ModelSerializer):
@@ -208,9 +227,8 @@ class PostRecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(
         read_only=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField()
     )
     ingredients = IngredientsRecipePostSerializer(
         many=True
@@ -227,42 +245,66 @@ class PostRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'tags', 'author', 'ingredients',
                   'name', 'image', 'text', 'cooking_time')
 
-    def validate_tags(self, tags):
-        current_tags = set()
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    'Указанного тега не существует! Измените теги.'
-                )
-            if tag in current_tags:
-                raise serializers.ValidationError(
-                    'Теги повторяются! Измените теги.'
-                )
-            current_tags.add(tag)
-        return tags
+    def get_tags(self, tag_ids):
+        return Tag.objects.in_bulk(tag_ids)
+
+    def get_ingredient_ids(self, ingredient_ids):
+        return set(
+            Ingredient.objects.filter(
+                id__in=ingredient_ids
+            ).values_list('id', flat=True)
+        )
+
+    def validate_tags(self, tag_ids):
+        errors = []
+        duplicates = get_duplicates(tag_ids)
+        if duplicates:
+            errors.append(
+                f'Теги повторяются: {format_ids(duplicates)}! Измените теги.'
+            )
+        tags = self.get_tags(tag_ids)
+        missing = set(tag_ids) - set(tags)
+        if missing:
+            errors.append(
+                f'Указанных тегов не существует: {format_ids(missing)}! '
+                'Измените теги.'
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [tags[tag_id] for tag_id in dict.fromkeys(tag_ids)]
 
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError(
                 'Без ингредиентов ничего не приготовишь :('
             )
-        current_ingredients_ids = set()
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('id')
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError(
-                    'Указанного ингредиента не существует! '
-                    'Измените состав рецепта.'
-                )
-            if ingredient_id in current_ingredients_ids:
-                raise serializers.ValidationError(
-                    'Ингредиенты повтоярются! Измените состав рецепта.'
-                )
-            if ingredient.get('amount') < 1:
-                raise serializers.ValidationError(
-                    'Маловато будет на готовку! Измените кол-во ингредиента.'
-                )
-            current_ingredients_ids.add(ingredient_id)
+        errors = []
+        ingredient_ids = [ingredient.get('id') for ingredient in ingredients]
+        duplicates = get_duplicates(ingredient_ids)
+        if duplicates:
+            errors.append(
+                f'Ингредиенты повторяются: {format_ids(duplicates)}! '
+                'Измените состав рецепта.'
+            )
+        missing = set(ingredient_ids) - self.get_ingredient_ids(
+            ingredient_ids
+        )
+        if missing:
+            errors.append(
+                f'Указанных ингредиентов не существует: '
+                f'{format_ids(missing)}! Измените состав рецепта.'
+            )
+        too_small = [
+            ingredient.get('id') for ingredient in ingredients
+            if ingredient.get('amount') < 1
+        ]
+        if too_small:
+            errors.append(
+                f'Маловато будет на готовку: {format_ids(too_small)}! '
+                'Измените кол-во ингредиента.'
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
         return ingredients
 
     def validate_cooking_time(self, cooking_time):
@@ -271,6 +313,7 @@ class PostRecipeSerializer(serializers.ModelSerializer):
                 'Меньше, чем за минуту ничего не приготовишь :(')
         return cooking_time
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -284,28 +327,86 @@ class PostRecipeSerializer(serializers.ModelSerializer):
             )
             for ingredient in ingredients
         )
+        recipes_updated.send(sender=Recipe, recipe_ids=[recipe.id])
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        """Приводит ингредиенты рецепта к новому составу, изменяя только
+        отличающиеся строки."""
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in instance.ingredient.all()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=instance, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount', ))
+        added = amounts.keys() - current.keys()
+        if added:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=instance,
+                    ingredient_id=ingredient_id,
+                    amount=amounts[ingredient_id]
+                )
+                for ingredient_id in added
+            )
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        RecipeIngredient.objects.bulk_create(
-            RecipeIngredient(
-                recipe=instance,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredients
-        )
-        instance.save()
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        recipes_updated.send(sender=Recipe, recipe_ids=[instance.id])
         return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().get(id=instance.id)
         return GetRecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
+
+
+class RecipeImportSerializer(PostRecipeSerializer):
+    """Проверяет рецепт из пакетной загрузки.
+
+    Теги и ингредиенты берутся из контекста, куда они загружаются заранее
+    для всей пачки рецептов.
+    """
+
+    def get_tags(self, tag_ids):
+        return self.context['tags']
+
+    def get_ingredient_ids(self, ingredient_ids):
+        return self.context['ingredient_ids']
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    format = serializers.ChoiceField(
+        choices=[renderer.format for renderer in SHOPPING_LIST_RENDERERS],
+        default=SHOPPING_LIST_RENDERERS[0].format
+    )
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'format', 'status', 'error', 'created')
+        read_only_fields = ('status', 'error', 'created')
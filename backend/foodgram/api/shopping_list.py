@@ -0,0 +1,198 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from recipes.models import Ingredient
+
+FONT_NAME = 'FreeSans'
+FONT_PATH = settings.BASE_DIR / 'FreeSans.ttf'
+FONT_SIZE = 24  # Размер шрифта для пдф в пунктах
+LINE_LEADING = FONT_SIZE * 1.2  # Межстрочный интервал для пдф в пунктах
+TEXT_INDENT = 15  # Отступ для текста для пдф, в миллиметрах
+LINES_PER_PAGE = int((A4[1] - 2 * TEXT_INDENT * mm) // LINE_LEADING)
+TITLE = '--- Список покупок Foodgram ---'
+CSV_HEADER = ('name', 'measurement_unit', 'amount')
+
+
+def get_shopping_list(user):
+    """Возвращает список (название, единицы измерения, количество)
+    ингредиентов из корзины пользователя."""
+    return list(
+        Ingredient.objects.filter(
+            recipe__recipe__in_carts__user=user
+        ).values_list(
+            'name',
+            'measurement_unit'
+        ).annotate(
+            amount=Sum('recipe__amount')
+        ).order_by('name', 'measurement_unit')
+    )
+
+
+def get_lines(shopping_list):
+    yield TITLE
+    yield ''
+    for number, (name, measurement_unit, amount) in enumerate(
+        shopping_list, start=1
+    ):
+        yield f'{number}) {name} - {amount}, {measurement_unit}'
+    yield ''
+    yield TITLE
+
+
+def get_digest(shopping_list):
+    return hashlib.sha256(
+        json.dumps(shopping_list, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def render_pdf(shopping_list, file):
+    register_font()
+    pdf = canvas.Canvas(file, pagesize=A4, bottomup=0)
+    lines = list(get_lines(shopping_list))
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        text_obj = pdf.beginText()
+        text_obj.setTextOrigin(TEXT_INDENT * mm, TEXT_INDENT * mm)
+        text_obj.setFont(FONT_NAME, FONT_SIZE, LINE_LEADING)
+        for line in lines[start:start + LINES_PER_PAGE]:
+            text_obj.textLine(line)
+        pdf.drawText(text_obj)
+        pdf.showPage()
+    pdf.save()
+
+
+def get_pdf_path(shopping_list):
+    """Возвращает путь к пдф со списком покупок.
+
+    Файлы кэшируются по хэшу содержимого списка, поэтому повторная
+    загрузка неизменной корзины не перерисовывает документ. Время
+    изменения найденного файла обновляется, чтобы expire_export_jobs не
+    удалил используемый документ.
+    """
+    cache_dir = settings.SHOPPING_LIST_CACHE_DIR
+    path = cache_dir / f'{get_digest(shopping_list)}.pdf'
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, suffix='.tmp', delete=False
+    ) as file:
+        try:
+            render_pdf(shopping_list, file)
+        except Exception:
+            file.close()
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+    return path
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Выбирается DRF по параметру ?format= или заголовку Accept. Сам список
+    отрисовывается во вьюсете через get_file(), а render() используется только
+    для ответов с ошибками и отдает их в JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context['response']['Content-Type'] = (
+            JSONRenderer.media_type
+        )
+        return JSONRenderer().render(data)
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render_shopping_list(self, shopping_list, file):
+        raise NotImplementedError(
+            'Рендерер должен реализовать render_shopping_list()'
+        )
+
+    def get_file(self, shopping_list):
+        file = io.BytesIO()
+        self.render_shopping_list(shopping_list, file)
+        file.seek(0)
+        return file
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+    def render_shopping_list(self, shopping_list, file):
+        render_pdf(shopping_list, file)
+
+    def get_file(self, shopping_list):
+        try:
+            return open(get_pdf_path(shopping_list), 'rb')
+        except FileNotFoundError:
+            # Файл удалили из кэша между проверкой и открытием.
+            return open(get_pdf_path(shopping_list), 'rb')
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render_shopping_list(self, shopping_list, file):
+        file.write('\n'.join(get_lines(shopping_list)).encode())
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render_shopping_list(self, shopping_list, file):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(shopping_list)
+        file.write(text.getvalue().encode())
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render_shopping_list(self, shopping_list, file):
+        file.write(json.dumps(
+            [dict(zip(CSV_HEADER, row)) for row in shopping_list],
+            ensure_ascii=False
+        ).encode())
+
+
+# Первый рендерер используется по умолчанию.
+SHOPPING_LIST_RENDERERS = (
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
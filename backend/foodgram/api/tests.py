@@ -0,0 +1,425 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.read_serializers import RecipeReadSerializer
+from api.serializers import GetRecipeSerializer
+from api.shopping_list import PDFShoppingListRenderer, get_pdf_path
+from recipes.models import (ExportJob, Ingredient, Recipe, RecipeFavorite,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.scores import compute_recipe_scores
+from recipes.similar import build_similar_recipes
+from recipes.user_state import (EMPTY_USER_STATE, get_cache_key,
+                                get_generation, invalidate_user_state,
+                                load_user_state)
+from recipes.versions import RECIPES, get_table_version, version_cache
+from users.models import Subscription, User
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password'
+    )
+
+
+class RecipeAPITestCase(APITestCase):
+    """Общие данные тестов: авторы, теги, ингредиенты и рецепты с
+    избранным, списком покупок и подпиской читателя."""
+    recipes_count = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user(0)
+        cls.authors = [create_user(number) for number in range(1, 4)]
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number:02}', measurement_unit='г')
+            for number in range(50)
+        )
+        cls.recipes = []
+        for number in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10
+            )
+            recipe.tags.set(cls.tags[:number % len(cls.tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + shift) % 50],
+                    amount=shift + 1
+                )
+                for shift in range(4)
+            )
+            cls.recipes.append(recipe)
+        RecipeFavorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[1])
+        Subscription.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        version_cache.clear()
+        self.client.force_authenticate(self.reader)
+
+
+class RecipeListQueriesTest(RecipeAPITestCase):
+    # Избранное, список покупок и подписки читателя, число рецептов,
+    # страница рецептов, их теги и ингредиенты.
+    LIST_QUERIES = 7
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for limit in (3, 30):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(
+                self.LIST_QUERIES
+            ):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_user_flags(self):
+        response = self.client.get(f'/api/recipes/?limit={self.recipes_count}')
+        recipes = {
+            recipe['id']: recipe for recipe in response.data['results']
+        }
+        self.assertTrue(recipes[self.recipes[0].id]['is_favorited'])
+        self.assertFalse(recipes[self.recipes[1].id]['is_favorited'])
+        self.assertTrue(recipes[self.recipes[1].id]['is_in_shopping_cart'])
+        self.assertFalse(recipes[self.recipes[0].id]['is_in_shopping_cart'])
+        self.assertTrue(
+            recipes[self.recipes[0].id]['author']['is_subscribed']
+        )
+        self.assertFalse(
+            recipes[self.recipes[1].id]['author']['is_subscribed']
+        )
+
+
+class RecipeValidationTest(RecipeAPITestCase):
+
+    def test_invalid_tags_and_ingredients_are_reported_together(self):
+        tag_ids = [self.tags[0].id, self.tags[0].id, 9999]
+        ingredients = [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in self.ingredients[:38]
+        ]
+        ingredients += [
+            {'id': self.ingredients[0].id, 'amount': 5},
+            {'id': 9998, 'amount': 1},
+            {'id': 9999, 'amount': 1},
+        ]
+        # Одна проверка тегов и одна проверка ингредиентов.
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                '/api/recipes/',
+                {
+                    'name': 'Рецепт',
+                    'text': 'Описание',
+                    'cooking_time': 10,
+                    'tags': tag_ids,
+                    'ingredients': ingredients,
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'tags': [
+                f'Теги повторяются: {self.tags[0].id}! Измените теги.',
+                'Указанных тегов не существует: 9999! Измените теги.',
+            ],
+            'ingredients': [
+                f'Ингредиенты повторяются: {self.ingredients[0].id}! '
+                'Измените состав рецепта.',
+                'Указанных ингредиентов не существует: 9998, 9999! '
+                'Измените состав рецепта.',
+            ],
+        })
+
+
+class RecipeReadSerializerTest(RecipeAPITestCase):
+    """RecipeReadSerializer должен отдавать те же данные, что и
+    GetRecipeSerializer."""
+
+    def get_context(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return {'request': request}
+
+    def assert_same_data(self, user):
+        recipes = Recipe.objects.with_related().order_by('id')
+        for recipe in recipes:
+            with self.subTest(recipe=recipe.name):
+                self.assertEqual(
+                    RecipeReadSerializer(
+                        recipe, context=self.get_context(user)
+                    ).data,
+                    GetRecipeSerializer(
+                        recipe, context=self.get_context(user)
+                    ).data
+                )
+        self.assertEqual(
+            RecipeReadSerializer(
+                recipes, many=True, context=self.get_context(user)
+            ).data,
+            GetRecipeSerializer(
+                recipes, many=True, context=self.get_context(user)
+            ).data
+        )
+
+    def set_images(self):
+        Recipe.objects.filter(id=self.recipes[0].id).update(
+            image='recipes/images/original.jpg'
+        )
+        Recipe.objects.filter(id=self.recipes[1].id).update(
+            image='recipes/images/original.jpg',
+            image_medium='recipes/images/medium.webp'
+        )
+
+    def test_anonymous_without_images(self):
+        self.assert_same_data(AnonymousUser())
+
+    def test_authenticated_without_images(self):
+        self.assert_same_data(self.reader)
+
+    def test_anonymous_with_images(self):
+        self.set_images()
+        self.assert_same_data(AnonymousUser())
+
+    def test_authenticated_with_images(self):
+        self.set_images()
+        self.assert_same_data(self.reader)
+        data = RecipeReadSerializer(
+            Recipe.objects.with_related().get(id=self.recipes[1].id),
+            context=self.get_context(self.reader)
+        ).data
+        self.assertTrue(data['image'].endswith('/recipes/images/medium.webp'))
+        self.assertTrue(data['is_in_shopping_cart'])
+
+
+class ScoreOrderingTest(RecipeAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def promote(self, recipe, users):
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for user in users
+        )
+        compute_recipe_scores()
+
+    def get_names(self, url):
+        return [
+            recipe['name']
+            for recipe in self.client.get(url).data['results']
+        ]
+
+    def test_cached_feed_refreshes_after_scores_update(self):
+        url = '/api/recipes/?ordering=popular&limit=2'
+        self.promote(self.recipes[5], self.authors)
+        self.assertEqual(self.get_names(url)[0], self.recipes[5].name)
+        # Рейтинги пересчитывает другой процесс: версия рецептов в кэше
+        # веб-сервера при этом не меняется.
+        self.promote(self.recipes[7], [*self.authors, self.reader])
+        self.assertEqual(self.get_names(url)[0], self.recipes[7].name)
+
+    def test_cursor_pagination_keeps_score_ordering(self):
+        self.promote(self.recipes[5], self.authors)
+        response = self.client.get(
+            '/api/recipes/?ordering=popular&pagination=cursor&limit=2'
+        )
+        self.assertEqual(
+            response.data['results'][0]['name'], self.recipes[5].name
+        )
+        self.assertIn('count', response.data)
+
+    def test_cached_feed_refreshes_after_favorite(self):
+        url = '/api/recipes/?ordering=-favorites_count&limit=1'
+        self.assertEqual(self.get_names(url), [self.recipes[0].name])
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.authors:
+                RecipeFavorite.objects.create(
+                    user=user, recipe=self.recipes[3]
+                )
+        self.assertEqual(self.get_names(url), [self.recipes[3].name])
+
+
+class UserStateTest(RecipeAPITestCase):
+
+    def test_state_cached_during_invalidation_is_not_served(self):
+        # Запрос прочитал поколение и устаревшие данные, а сохранил их в
+        # кэш уже после того, как пользователь изменил избранное.
+        generation = get_generation(self.reader.id)
+        invalidate_user_state(self.reader.id)
+        cache.set(
+            get_cache_key(self.reader.id, generation), EMPTY_USER_STATE
+        )
+        state = load_user_state(self.reader)
+        self.assertEqual(state.favorites, {self.recipes[0].id})
+        self.assertEqual(state.carts, {self.recipes[1].id})
+        self.assertEqual(state.following, {self.authors[0].id})
+
+    def test_favorite_resets_state(self):
+        self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipes[2].id}/favorite/')
+        self.assertIn(
+            self.recipes[2].id, load_user_state(self.reader).favorites
+        )
+
+    def test_favorite_is_not_hidden_by_last_modified(self):
+        url = f'/api/recipes/{self.recipes[2].id}/'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipes[2].id}/favorite/')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+
+class DataVersionTest(RecipeAPITestCase):
+
+    def test_version_survives_response_cache_eviction(self):
+        version = get_table_version(RECIPES)
+        generation = get_generation(self.reader.id)
+        cache.clear()
+        self.assertEqual(get_table_version(RECIPES), version)
+        self.assertEqual(get_generation(self.reader.id), generation)
+
+    @override_settings(FEED_WORKERS=0)
+    def test_version_changes_after_commit(self):
+        version = get_table_version(RECIPES)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                '/api/recipes/',
+                {
+                    'name': 'Новый рецепт',
+                    'text': 'Описание',
+                    'cooking_time': 10,
+                    'tags': [self.tags[0].id],
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 10}
+                    ],
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        # До фиксации читатели должны видеть прежнюю версию.
+        self.assertEqual(get_table_version(RECIPES), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_table_version(RECIPES), version)
+
+
+class SimilarRecipesTest(RecipeAPITestCase):
+
+    def test_unknown_recipe(self):
+        response = self.client.get('/api/recipes/999999/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_similar_recipes(self):
+        build_similar_recipes()
+        response = self.client.get(
+            f'/api/recipes/{self.recipes[0].id}/similar/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        self.assertNotIn(
+            self.recipes[0].id, [recipe['id'] for recipe in response.data]
+        )
+
+
+class ShoppingListDownloadTest(RecipeAPITestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def test_pdf_is_exported_in_background(self):
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(user=self.reader)
+        self.assertEqual(job.format, 'pdf')
+        self.assertEqual(response.data['id'], job.id)
+        self.assertEqual(response['Location'], f'/api/exports/{job.id}/')
+
+    def test_small_text_list_is_returned_at_once(self):
+        response = self.client.get(self.url, {'format': 'txt'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ExportJob.objects.exists())
+
+    @override_settings(SHOPPING_LIST_SYNC_MAX_ITEMS=3)
+    def test_large_list_is_exported_in_background(self):
+        response = self.client.get(self.url, {'format': 'txt'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ExportJob.objects.get().format, 'txt')
+
+    def test_sync_fallback(self):
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(
+            SHOPPING_LIST_SYNC_FORMATS=['pdf'],
+            SHOPPING_LIST_CACHE_DIR=Path(cache_dir)
+        ):
+            response = self.client.get(self.url, {'format': 'pdf'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            response.close()
+
+
+class ShoppingListPDFTest(TestCase):
+
+    def test_failed_render_leaves_no_temporary_file(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.settings(SHOPPING_LIST_CACHE_DIR=Path(cache_dir)):
+                with mock.patch(
+                    'api.shopping_list.render_pdf', side_effect=ValueError
+                ), self.assertRaises(ValueError):
+                    get_pdf_path([('Соль', 'г', 10)])
+                self.assertEqual(os.listdir(cache_dir), [])
+                path = get_pdf_path([('Соль', 'г', 10)])
+                self.assertEqual(os.listdir(cache_dir), [path.name])
+
+    def test_cached_file_is_touched(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.settings(SHOPPING_LIST_CACHE_DIR=Path(cache_dir)):
+                path = get_pdf_path([('Соль', 'г', 10)])
+                os.utime(path, (0, 0))
+                self.assertEqual(get_pdf_path([('Соль', 'г', 10)]), path)
+                self.assertGreater(path.stat().st_mtime, 0)
+
+    def test_file_evicted_before_open_is_rendered_again(self):
+        paths = []
+
+        def get_evicted_pdf_path(shopping_list):
+            path = get_pdf_path(shopping_list)
+            if not paths:
+                path.unlink()
+            paths.append(path)
+            return path
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.settings(
+                SHOPPING_LIST_CACHE_DIR=Path(cache_dir)
+            ), mock.patch(
+                'api.shopping_list.get_pdf_path',
+                side_effect=get_evicted_pdf_path
+            ):
+                with PDFShoppingListRenderer().get_file(
+                    [('Соль', 'г', 10)]
+                ) as file:
+                    self.assertEqual(file.read(4), b'%PDF')
+        self.assertEqual(len(paths), 2)
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                       UserViewSet, login, logout)
+from api.views import (ExportJobViewSet, IngredientViewSet, RecipeViewSet,
+                       TagViewSet, UserViewSet, login, logout)
 
 app_name = 'api'
 
@@ -11,6 +11,7 @@ router.register(r'users', UserViewSet, basename='user')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
+router.register(r'exports', ExportJobViewSet, basename='exports')
 auth_urls = [
     path('login/', login),
     path('logout/', logout),
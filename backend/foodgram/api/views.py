@@ -1,36 +1,42 @@
-import io
-
-from django.db.models import Sum
+from django.conf import settings
+from django.db.models import Prefetch, Value, prefetch_related_objects
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.conditional import ConditionalGetMixin, conditional_get
+from api.exports import needs_export_job
+from api.feed_cache import cache_anonymous_response, feed_cache
+from api.filters import (IngredientFilter, RecipeFilter, orders_by_counts,
+                         orders_by_score)
 from api.pagination import PageLimitPagination
+from api.parsers import JSONLinesParser
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (GetRecipeSerializer, IngredientSerializer,
-                             LoginSerializer, PasswordSerializer,
-                             PostRecipeSerializer,
+from api.recipe_import import import_recipes
+from api.read_serializers import RecipeReadSerializer
+from api.serializers import (ExportJobSerializer, IngredientSerializer,
+                             LoginSerializer, PantrySerializer,
+                             PasswordSerializer, PostRecipeSerializer,
                              SubscriptionRecipeSerializer,
                              SubscriptionSerializer, TagSerializer,
                              UserSerializer)
-from recipes.models import (Ingredient, Recipe, RecipeFavorite, ShoppingCart,
-                            Tag)
+from api.shopping_list import SHOPPING_LIST_RENDERERS, get_shopping_list
+from recipes.feed import get_feed
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (ExportJob, Ingredient, Recipe, RecipeFavorite,
+                            ShoppingCart, Tag)
+from recipes.pantry_index import pantry_index
+from recipes.versions import (COUNTS, INGREDIENTS, RECIPES, TAGS,
+                              get_scores_version, get_table_version)
 from users.models import Subscription, User
 
-FONT_SIZE = 24  # Размер шрифта для пдф в пунктах
-TEXT_INDENT = 15  # Отступ для текста для пдф, в миллиметрах
-
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -60,6 +66,7 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     pagination_class = PageLimitPagination
     permission_classes = (AllowAny, )
+    cursor_ordering = ('-id', )
 
     @action(
         detail=False,
@@ -113,8 +120,22 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated, )
     )
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(following__user=request.user)
+        subscriptions = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        )
         paginated_subscriptions = self.paginate_queryset(subscriptions)
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get('recipes_limit')
+        if limit:
+            recipes = Recipe.objects.latest_by_authors(
+                paginated_subscriptions, int(limit)
+            )
+        prefetch_related_objects(
+            paginated_subscriptions,
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+        )
         serializer = SubscriptionSerializer(
             paginated_subscriptions,
             many=True,
@@ -123,16 +144,101 @@ class UserViewSet(viewsets.ModelViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.select_related('author')
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.all()
     pagination_class = PageLimitPagination
+    cursor_ordering = ('-pub_date', '-id')
     permission_classes = (IsAuthorOrReadOnly, )
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    version_tables = (RECIPES, )
+    user_dependent = True
+
+    def get_versions(self, request):
+        versions = super().get_versions(request)
+        if self.action != 'list':
+            return versions
+        if orders_by_score(request.query_params):
+            versions.append(get_scores_version())
+        if orders_by_counts(request.query_params):
+            versions.append(get_table_version(COUNTS))
+        return versions
+
+    @conditional_get
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAdminUser, ))
+    def feed_cache_stats(self, request):
+        return Response(feed_cache.stats())
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated, ))
+    def feed(self, request):
+        recipe_ids = self.paginate_queryset(get_feed(request.user))
+        recipes = Recipe.objects.with_related().in_bulk(recipe_ids)
+        return self.get_paginated_response(RecipeReadSerializer(
+            [
+                recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score')
+        return Response(SubscriptionRecipeSerializer(
+            recipes,
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=False, methods=['get'])
+    def what_to_cook(self, request):
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        matches = self.paginate_queryset(pantry_index.match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['coverage'] / 100
+        ))
+        recipes = Recipe.objects.with_related().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        matches = [match for match in matches if match[0] in recipes]
+        data = RecipeReadSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in matches],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, (_, coverage, missing) in zip(data, matches):
+            item['coverage'] = round(coverage * 100)
+            item['missing_count'] = missing
+        return self.get_paginated_response(data)
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.with_related()
+        return Recipe.objects.select_related('author')
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
-            return GetRecipeSerializer
+            return RecipeReadSerializer
         return PostRecipeSerializer
 
     def perform_create(self, serializer):
@@ -193,57 +299,117 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(IsAuthenticated,))
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=A4, bottomup=0)
-        pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
-        pdf.setFont('FreeSans', FONT_SIZE)
-        text_obj = pdf.beginText()
-        text_obj.setTextOrigin(TEXT_INDENT * mm, TEXT_INDENT * mm)
-        shopping_cart = Ingredient.objects.filter(
-            recipe__recipe__in_carts__user=request.user
-        ).values(
-            'name',
-            'measurement_unit'
-        ).annotate(amount=Sum('recipe__amount')).order_by()
-        lines = []
-        lines.append("--- Список покупок Foodgram ---")
-        lines.append("")
-        ingredient_number = 1
-        for ingredient in shopping_cart:
-            name = ingredient.get('name')
-            amount = ingredient.get('amount')
-            measurement_unit = ingredient.get('measurement_unit')
-            lines.append(
-                f'{ingredient_number}) '
-                f'{name} - '
-                f'{amount}, '
-                f'{measurement_unit}'
+        renderer = request.accepted_renderer
+        shopping_list = get_shopping_list(request.user)
+        if needs_export_job(renderer, shopping_list):
+            job = ExportJob.objects.create(
+                user=request.user, format=renderer.format
+            )
+            return Response(
+                ExportJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={
+                    'Location': reverse(
+                        'api:exports-detail', args=(job.id, )
+                    )
+                }
             )
-            ingredient_number += 1
-        lines.append("")
-        lines.append("--- Список покупок Foodgram ---")
-        for line in lines:
-            text_obj.textLine(line)
-        pdf.drawText(text_obj)
-        pdf.showPage()
-        pdf.save()
-        buffer.seek(0)
         return FileResponse(
-            buffer, as_attachment=True, filename='foodgram_shopping_cart.pdf'
+            renderer.get_file(shopping_list),
+            as_attachment=True,
+            filename=f'foodgram_shopping_cart.{renderer.format}',
+            content_type=renderer.get_content_type()
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONLinesParser,))
+    def bulk(self, request):
+        results = list(import_recipes(request.data, request.user))
+        created = sum('id' in result for result in results)
+        return Response(
+            {
+                'created': created,
+                'failed': len(results) - created,
+                'results': results
+            },
+            status=(
+                status.HTTP_201_CREATED if created
+                else status.HTTP_400_BAD_REQUEST
+            )
         )
 
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=(IsAuthenticated,))
+    def export_shopping_cart(self, request):
+        serializer = ExportJobSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class ExportJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = ExportJobSerializer
+    permission_classes = (IsAuthenticated, )
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk):
+        job = self.get_object()
+        if job.status != ExportJob.DONE:
+            return Response(
+                {'errors': 'Выгрузка еще не готова!'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f'foodgram_shopping_cart.{job.format}'
+        )
+
+
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    version_tables = (TAGS, )
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
+    version_tables = (INGREDIENTS, )
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit', '')
+        max_limit = settings.INGREDIENT_SEARCH_LIMIT
+        limit = min(int(limit), max_limit) if limit.isdigit() else max_limit
+        return Response(ingredient_index.search(name, limit))
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -92,6 +92,61 @@ DATABASES = {
     }
 }
 
+# Кэш общий для всех процессов: через него веб-сервер и фоновые
+# обработчики обмениваются версиями данных и поколениями состояния
+# пользователей. В контейнерах каталог лежит на общем томе.
+FILE_CACHE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+def get_cache_settings(prefix, location, max_entries):
+    """Настройки кэша из переменных окружения {prefix}_BACKEND,
+    {prefix}_LOCATION и {prefix}_MAX_ENTRIES. Предел записей действует
+    только для файлового кэша: при его превышении файловый кэш удаляет
+    часть записей без учета их возраста."""
+    backend = os.getenv(f'{prefix}_BACKEND', default=FILE_CACHE_BACKEND)
+    config = {
+        'BACKEND': backend,
+        'LOCATION': os.getenv(f'{prefix}_LOCATION', default=str(location)),
+    }
+    if backend == FILE_CACHE_BACKEND:
+        config['OPTIONS'] = {
+            'MAX_ENTRIES': int(
+                os.getenv(f'{prefix}_MAX_ENTRIES', default=max_entries)
+            ),
+        }
+    return config
+
+
+CACHES = {
+    'default': get_cache_settings(
+        'CACHE', BASE_DIR / 'cache' / 'django', 100_000
+    ),
+    # Версии данных и поколения состояния пользователей: их потеря
+    # сбрасывает ETag и кэш ответов, поэтому они хранятся отдельно от
+    # основного кэша, в котором записи вытесняются при переполнении.
+    'versions': get_cache_settings(
+        'VERSIONS_CACHE', BASE_DIR / 'cache' / 'versions', 10_000_000
+    ),
+}
+
+USER_STATE_CACHE_TTL = 60 * 10  # Время жизни кэша состояния пользователя, с
+TABLE_VERSION_CACHE_TTL = 60 * 5  # Время жизни версий данных для ETag, с
+FEED_CACHE_SIZE = 1000  # Максимум ответов в кэше ленты для анонимов
+SEARCH_INDEX_TTL = 60 * 5  # Время жизни поискового индекса в памяти, с
+SEARCH_RESULTS_LIMIT = 500  # Максимум рецептов в результатах поиска без PG
+PANTRY_INDEX_TTL = 60 * 5  # Время жизни индекса состава рецептов, с
+PANTRY_MIN_COVERAGE = 50  # Доля имеющихся ингредиентов рецепта по умолчанию, %
+# Рецепты авторов с большим числом подписчиков не рассылаются по лентам,
+# а подмешиваются в ленту при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_MAX_ITEMS = 500  # Глубина ленты подписок в рецептах
+FEED_WORKERS = 1  # Потоков рассылки рецептов по лентам, 0 - без фона
+# Периоды полураспада веса добавлений в избранное и корзину для
+# рейтингов popular и trending, в часах.
+POPULAR_HALF_LIFE = 24 * 30
+TRENDING_HALF_LIFE = 24
+SIMILAR_RECIPES_COUNT = 10  # Количество хранимых похожих рецептов
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -132,6 +187,35 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Кэш пдф общий для backend и export_worker: его чистит только обработчик
+# выгрузок, поэтому в контейнерах каталог должен быть на общем томе.
+SHOPPING_LIST_CACHE_DIR = BASE_DIR / 'cache' / 'shopping_lists'
+
+# Форматы, в которых download_shopping_cart отдает список покупок сразу,
+# и наибольшее число строк такого списка. Остальные выгрузки ставятся в
+# очередь export_worker с ответом 202. Пока фронтенд не умеет ждать
+# выгрузку, в SHOPPING_LIST_SYNC_FORMATS можно перечислить все форматы.
+SHOPPING_LIST_SYNC_FORMATS = os.getenv(
+    'SHOPPING_LIST_SYNC_FORMATS', default='txt,csv,json'
+).split(',')
+SHOPPING_LIST_SYNC_MAX_ITEMS = int(
+    os.getenv('SHOPPING_LIST_SYNC_MAX_ITEMS', default=500)
+)
+
+EXPORT_JOB_MAX_ATTEMPTS = 3
+EXPORT_JOB_TTL = 60 * 60 * 24  # Время хранения выгрузок, в секундах
+# Задача, которая выполняется дольше, считается брошенной упавшим
+# обработчиком и снова забирается из очереди, в секундах.
+EXPORT_JOB_LEASE = 60 * 10
+EXPORT_JOB_RETRY_DELAY = 30  # Пауза перед первым повтором, удваивается, с
+
+# Количество потоков для обработки изображений рецептов; 0 - обрабатывать
+# сразу после сохранения рецепта.
+IMAGE_WORKERS = 2
+
+INGREDIENT_INDEX_TTL = 60 * 5  # Время жизни индекса ингредиентов, в секундах
+INGREDIENT_SEARCH_LIMIT = 50  # Максимум подсказок при поиске ингредиента
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -147,6 +231,22 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
+
+# JSON API через orjson, если он установлен; иначе стандартный json.
+FAST_JSON = os.getenv('FAST_JSON', default='true').lower() == 'true'
+
+# Начиная с этого числа строк в таблице пагинация берет оценку количества
+# из статистики PostgreSQL вместо COUNT(*); None отключает оценку.
+APPROXIMATE_COUNT_THRESHOLD = 100000
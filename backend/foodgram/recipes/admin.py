@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from recipes.models import (Ingredient, Recipe, RecipeFavorite,
-                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.models import (ExportJob, FeedItem, Ingredient, Recipe,
+                            RecipeFavorite, RecipeIngredient, ShoppingCart,
+                            Tag)
+from recipes.signals import recipes_updated
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -21,7 +23,11 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline, )
 
     def in_favorites(self, obj):
-        return obj.in_favorites.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipes_updated.send(sender=Recipe, recipe_ids=[form.instance.id])
 
 
 @admin.register(Ingredient)
@@ -56,3 +62,15 @@ class RecipeFavoriteAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'format', 'status', 'attempts', 'created')
+    list_filter = ('status', 'format')
+
+
+@admin.register(FeedItem)
+class FeedItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe', 'pub_date')
+    raw_id_fields = ('user', 'author', 'recipe')
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, RecipeFavorite, ShoppingCart
+from recipes.versions import COUNTS, bump_table_version
+from users.models import Subscription, User
+
+# Модель со счетчиком, поле счетчика, считаемая модель и ее внешний ключ.
+COUNTERS = (
+    (Recipe, 'favorites_count', RecipeFavorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+def change_counter(model, pk, counter, delta):
+    """Атомарно изменяет счетчик на delta, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter}__gte': -delta})
+    queryset.update(**{counter: F(counter) + delta})
+
+
+def get_actual_count(related_model, field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+def reconcile_counters():
+    """Пересчитывает все счетчики и возвращает число исправленных строк
+    для каждого из них."""
+    fixed = {}
+    for model, counter, related_model, field in COUNTERS:
+        actual = get_actual_count(related_model, field)
+        fixed[f'{model.__name__}.{counter}'] = model.objects.exclude(
+            **{counter: actual}
+        ).update(**{counter: actual})
+    transaction.on_commit(lambda: bump_table_version(COUNTS))
+    return fixed
@@ -0,0 +1,173 @@
+import heapq
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from recipes.models import FeedItem, Recipe
+from users.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000  # Количество записей ленты, создаваемых за раз
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_WORKERS,
+            thread_name_prefix='recipe-feed'
+        )
+    return _executor
+
+
+def save_feed_items(items):
+    items = iter(items)
+    while batch := list(islice(items, BATCH_SIZE)):
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+@transaction.atomic
+def fan_out_recipes(recipe_ids):
+    """Рассылает рецепты по лентам подписчиков их авторов. Рецепты
+    авторов, у которых больше FEED_FANOUT_MAX_FOLLOWERS подписчиков,
+    не рассылаются и подмешиваются в ленту при чтении."""
+    recipes = defaultdict(list)
+    for recipe_id, author_id, pub_date in Recipe.objects.filter(
+        id__in=recipe_ids,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('id', 'author_id', 'pub_date'):
+        recipes[author_id].append((recipe_id, pub_date))
+    followers = Subscription.objects.filter(
+        author_id__in=recipes
+    ).values_list('author_id', 'user_id')
+    save_feed_items(
+        FeedItem(
+            user_id=user_id,
+            author_id=author_id,
+            recipe_id=recipe_id,
+            pub_date=pub_date
+        )
+        for author_id, user_id in followers.iterator(chunk_size=BATCH_SIZE)
+        for recipe_id, pub_date in recipes[author_id]
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора.
+    Подписка проверяется заново: пока задача ждала в пуле, пользователь
+    мог отписаться."""
+    if not Subscription.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return
+    recipes = Recipe.objects.filter(
+        author_id=author_id,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_MAX_ITEMS]
+    save_feed_items(
+        FeedItem(
+            user_id=user_id,
+            author_id=author_id,
+            recipe_id=recipe_id,
+            pub_date=pub_date
+        )
+        for recipe_id, pub_date in recipes
+    )
+
+
+def trim_feeds():
+    """Оставляет в ленте каждого пользователя не больше FEED_MAX_ITEMS
+    последних рецептов. Возвращает число удаленных записей."""
+    ranked = FeedItem.objects.annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=F('user'),
+            order_by=(F('pub_date').desc(), F('recipe_id').desc())
+        )
+    ).values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    return FeedItem.objects.filter(id__in=RawSQL(
+        f'SELECT ranked.id FROM ({sql}) AS ranked '
+        f'WHERE ranked.row_number > %s',
+        (*params, settings.FEED_MAX_ITEMS)
+    )).delete()[0]
+
+
+def repair_feeds(since):
+    """Восстанавливает ленты после потерянных фоновых задач: удаляет
+    записи без подписки, заново рассылает рецепты, опубликованные после
+    since, и обрезает ленты. Возвращает (удалено записей без подписки,
+    разослано рецептов, удалено лишних записей)."""
+    orphaned = FeedItem.objects.filter(
+        ~Exists(Subscription.objects.filter(
+            user=OuterRef('user'), author=OuterRef('author')
+        ))
+    ).delete()[0]
+    recipe_ids = iter(
+        Recipe.objects.filter(
+            pub_date__gte=since
+        ).values_list('id', flat=True).order_by('id')
+    )
+    fanned_out = 0
+    while batch := list(islice(recipe_ids, BATCH_SIZE)):
+        fan_out_recipes(batch)
+        fanned_out += len(batch)
+    return orphaned, fanned_out, trim_feeds()
+
+
+def run_in_worker(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты подписок: %s', args)
+    finally:
+        connection.close()
+
+
+def schedule_feed_update(func, *args):
+    """Ставит обновление лент в пул после фиксации транзакции.
+    При FEED_WORKERS = 0 обновление выполняется сразу."""
+    if not settings.FEED_WORKERS:
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_worker, func, *args)
+    )
+
+
+def get_feed(user):
+    """Возвращает id последних рецептов авторов, на которых подписан
+    пользователь: доставленные в его ленту вместе с рецептами популярных
+    авторов, выбранными при чтении. Доставленные рецепты отбираются по
+    действующим подпискам, поэтому запоздавшая рассылка не вернет в
+    ленту автора, от которого пользователь уже отписался."""
+    limit = settings.FEED_MAX_ITEMS
+    pushed = FeedItem.objects.filter(
+        user=user, author__following__user=user
+    ).values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    pulled = Recipe.objects.filter(
+        author__in=Subscription.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values('author_id')
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    recipe_ids = dict.fromkeys(
+        recipe_id for _, recipe_id in heapq.merge(
+            pushed, pulled, reverse=True
+        )
+    )
+    return list(islice(recipe_ids, limit))
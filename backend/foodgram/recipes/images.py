@@ -0,0 +1,105 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, features
+
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+from recipes.versions import RECIPES, bump_table_version
+
+logger = logging.getLogger(__name__)
+
+# Поле рецепта и максимальный размер его копии изображения в пикселях.
+RENDITIONS = {
+    'image_thumbnail': (320, 320),
+    'image_medium': (960, 960),
+}
+RENDITIONS_PATH = 'recipes/renditions/'
+IMAGE_QUALITY = 80
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    return _executor
+
+
+def save_rendition(image, size):
+    """Сохраняет уменьшенную копию изображения в WebP, а если Pillow
+    собран без него, то в JPEG."""
+    if features.check('webp'):
+        image_format, extension = 'WEBP', 'webp'
+    else:
+        image_format, extension = 'JPEG', 'jpg'
+        image = image.convert('RGB')
+    rendition = image.copy()
+    rendition.thumbnail(size)
+    buffer = io.BytesIO()
+    rendition.save(buffer, image_format, quality=IMAGE_QUALITY)
+    return recipe_image_storage.save(
+        f'{RENDITIONS_PATH}rendition.{extension}',
+        ContentFile(buffer.getvalue())
+    )
+
+
+def process_recipe_image(recipe_id):
+    """Считает хэш изображения рецепта и создает его копии для ленты
+    и карточек. Рецепты с тем же изображением переиспользуют копии."""
+    try:
+        recipe = Recipe.objects.filter(id=recipe_id).only('image').first()
+        if recipe is None or not recipe.image:
+            return
+        with recipe.image.open('rb') as file:
+            content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        renditions = Recipe.objects.filter(
+            image_hash=digest
+        ).exclude(
+            image_medium=''
+        ).values(*RENDITIONS).first()
+        if renditions is None:
+            image = Image.open(io.BytesIO(content))
+            image.load()
+            renditions = {
+                field: save_rendition(image, size)
+                for field, size in RENDITIONS.items()
+            }
+        Recipe.objects.filter(
+            id=recipe_id, image=recipe.image.name
+        ).update(image_hash=digest, **renditions)
+        bump_table_version(RECIPES)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id
+        )
+
+
+def process_recipe_image_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_recipe_image(recipe_id):
+    """Ставит обработку изображения в пул после фиксации транзакции.
+    При IMAGE_WORKERS = 0 обработка выполняется сразу."""
+    if not settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            process_recipe_image_in_worker, recipe_id
+        )
+    )
@@ -0,0 +1,80 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, get_table_version
+
+
+class IngredientIndex:
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Названия хранятся в отсортированном массиве, поиск по префиксу идет
+    через bisect, после префиксных совпадений добавляются совпадения по
+    подстроке. Индекс строится при первом обращении, сбрасывается
+    сигналами при изменении ингредиентов в этом процессе, перестраивается
+    при смене версии ингредиентов, например после load_ingredients в
+    другом процессе, и не реже раза в INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data = None
+        self._version = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['measurement_unit'])
+        )
+        return [row['name'].lower() for row in rows], rows
+
+    def _get_data(self):
+        data = self._data
+        version, _ = get_table_version(INGREDIENTS)
+        if (
+            data is not None
+            and self._version == version
+            and time.monotonic() - self._built_at
+            < settings.INGREDIENT_INDEX_TTL
+        ):
+            return data
+        with self._lock:
+            if self._data is data:
+                self._data = self._build()
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._data
+
+    def search(self, query, limit):
+        """Возвращает до limit ингредиентов: сначала начинающиеся с query,
+        затем содержащие query."""
+        query = query.lower()
+        names, rows = self._get_data()
+        result = []
+        position = bisect_left(names, query)
+        while (
+            position < len(names)
+            and len(result) < limit
+            and names[position].startswith(query)
+        ):
+            result.append(rows[position])
+            position += 1
+        if len(result) >= limit:
+            return result
+        for name, row in zip(names, rows):
+            if query in name and not name.startswith(query):
+                result.append(row)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
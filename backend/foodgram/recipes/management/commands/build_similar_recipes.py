@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similar import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты для измененных рецептов, '
+            'а с --full - для всех')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать похожие рецепты для всех рецептов'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Пересчитывать похожие рецепты каждые interval секунд'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = build_similar_recipes(full=options['full'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Пересчитано рецептов: {total}')
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
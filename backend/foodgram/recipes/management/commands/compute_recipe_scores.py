@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.scores import compute_recipe_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги рецептов popular и trending'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Пересчитывать рейтинги каждые interval секунд'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = compute_recipe_scores()
+            self.stdout.write(
+                self.style.SUCCESS(f'Рассчитаны рейтинги рецептов: {total}')
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+import posixpath
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import RENDITIONS_PATH
+from recipes.models import IMAGE_FIELDS, Recipe
+from recipes.storage import recipe_image_storage
+
+IMAGES_PATH = Recipe._meta.get_field('image').upload_to
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы изображений, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Не удалять файлы моложе указанного числа минут'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять удаление каждые interval секунд'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+
+    def delete_unused(self, options):
+        storage = recipe_image_storage
+        referenced = set()
+        for field in IMAGE_FIELDS:
+            referenced.update(
+                Recipe.objects.exclude(
+                    **{field: ''}
+                ).exclude(
+                    **{f'{field}__isnull': True}
+                ).values_list(field, flat=True).iterator()
+            )
+        created_before = timezone.now() - timedelta(
+            minutes=options['min_age']
+        )
+        deleted = 0
+        freed = 0
+        for path in (IMAGES_PATH, RENDITIONS_PATH):
+            if not storage.exists(path):
+                continue
+            for name in walk(storage, path.rstrip('/')):
+                if (
+                    name in referenced
+                    or storage.get_modified_time(name) > created_before
+                ):
+                    continue
+                freed += storage.size(name)
+                deleted += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых файлов: {deleted}, '
+            f'{freed / 1024 / 1024:.1f} МБ'
+        ))
+
+    def handle(self, *args, **options):
+        while True:
+            self.delete_unused(options)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
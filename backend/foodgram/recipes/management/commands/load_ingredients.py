@@ -0,0 +1,107 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, RECIPES, bump_table_version
+
+CHUNK_SIZE = 64 * 1024  # Размер читаемого из json-файла блока, в байтах
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_json(file):
+    """Потоково читает json-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in '[, \t\r\n':
+                position += 1
+            if position >= len(buffer) or buffer[position] == ']':
+                break
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield row['name'], row['measurement_unit']
+        if not chunk:
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из csv- или json-файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='Путь к файлу')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество ингредиентов в одном запросе на вставку'
+        )
+
+    def get_new_ingredients(self, rows):
+        """Отбрасывает повторы внутри файла и уже загруженные ингредиенты."""
+        seen = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        for name, measurement_unit in rows:
+            key = (name.strip(), measurement_unit.strip())
+            if key in seen:
+                continue
+            seen.add(key)
+            yield Ingredient(name=key[0], measurement_unit=key[1])
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                f'Неподдерживаемый формат файла: {path.suffix}'
+            )
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        started = time.monotonic()
+        created = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            ingredients = self.get_new_ingredients(reader(file))
+            while batch := list(islice(ingredients, batch_size)):
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                created += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Загружено {created} ингредиентов '
+                    f'({created / elapsed:.0f} в секунду)'
+                )
+        if created:
+            # bulk_create не отправляет сигналы: индекс этого процесса
+            # сбрасывается явно, остальные процессы видят новую версию.
+            ingredient_index.invalidate()
+            bump_table_version(INGREDIENTS, RECIPES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: добавлено {created} ингредиентов '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
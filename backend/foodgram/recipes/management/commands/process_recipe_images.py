@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает копии изображений рецептов, для которых их еще нет'
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.exclude(
+            image=''
+        ).exclude(
+            image=None
+        ).filter(
+            image_hash=''
+        ).values_list('id', flat=True)
+        processed = 0
+        for recipe_id in recipe_ids.iterator():
+            process_recipe_image(recipe_id)
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {processed}')
+        )
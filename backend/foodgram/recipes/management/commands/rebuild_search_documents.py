@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import update_search_documents
+
+BATCH_SIZE = 500  # Количество рецептов, обрабатываемых за раз
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые документы всех рецептов'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            update_search_documents(recipe_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые документы пересчитаны: {len(recipe_ids)}'
+        ))
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.feed import repair_feeds
+
+
+class Command(BaseCommand):
+    help = ('Восстанавливает ленты подписок после потерянных фоновых '
+            'задач и обрезает их до FEED_MAX_ITEMS рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=24,
+            help='Заново разослать рецепты за последние hours часов'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять восстановление каждые interval секунд'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            orphaned, fanned_out, trimmed = repair_feeds(
+                timezone.now() - timedelta(hours=options['hours'])
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено записей без подписки: {orphaned}, '
+                f'разослано рецептов: {fanned_out}, '
+                f'удалено лишних записей: {trimmed}'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+# Generated by Django 4.1.7 on 2026-10-18 01:16
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# Поиск по istartswith в PostgreSQL строится как UPPER("name"::text) LIKE,
+# поэтому индекс нужен на то же выражение с text_pattern_ops.
+INGREDIENT_NAME_INDEX = 'ingredient_name_upper_idx'
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в ингредиент с наименьшим id перед добавлением ограничения
+    unique_ingredient_unit. Количества ингредиентов, которые после
+    слияния повторяются в рецепте, складываются."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(count=Count('id'), keep_id=Min('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        ingredient_ids = list(
+            Ingredient.objects.filter(
+                name=duplicate['name'],
+                measurement_unit=duplicate['measurement_unit']
+            ).exclude(id=duplicate['keep_id']).values_list('id', flat=True)
+        )
+        kept = {}
+        for item in RecipeIngredient.objects.filter(
+            ingredient_id__in=[duplicate['keep_id'], *ingredient_ids]
+        ).order_by('recipe_id', 'ingredient_id'):
+            if item.recipe_id in kept:
+                kept[item.recipe_id].amount += item.amount
+                item.delete()
+                continue
+            kept[item.recipe_id] = item
+        for item in kept.values():
+            item.ingredient_id = duplicate['keep_id']
+            item.save(update_fields=('ingredient', 'amount'))
+        Ingredient.objects.filter(id__in=ingredient_ids).delete()
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX {INGREDIENT_NAME_INDEX} ON recipes_ingredient '
+        f'(UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_export_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+        migrations.RunPython(
+            create_ingredient_name_index,
+            drop_ingredient_name_index
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1.7 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+# Индексы повторяют выражения из recipes.search.search_postgresql.
+SEARCH_FTS_INDEX = 'recipe_search_fts_idx'
+SEARCH_TRGM_INDEX = 'recipe_search_trgm_idx'
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = Recipe.objects.only('id', 'name', 'text').prefetch_related(
+        'tags', 'ingredients'
+    )
+    for recipe in recipes.iterator(chunk_size=500):
+        recipe.search_document = ' '.join((
+            recipe.name,
+            *(ingredient.name for ingredient in recipe.ingredients.all()),
+            *(tag.name for tag in recipe.tags.all()),
+            recipe.text,
+        )).lower()
+        recipe.save(update_fields=('search_document', ))
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX {SEARCH_FTS_INDEX} ON recipes_recipe '
+        f"USING gin (to_tsvector('russian', search_document))"
+    )
+    schema_editor.execute(
+        f'CREATE INDEX {SEARCH_TRGM_INDEX} ON recipes_recipe '
+        f'USING gin (search_document gin_trgm_ops)'
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_FTS_INDEX}')
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_TRGM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(
+            fill_search_documents,
+            migrations.RunPython.noop
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
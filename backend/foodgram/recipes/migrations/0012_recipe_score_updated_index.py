@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_export_job_retries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipescore',
+            name='updated',
+            field=models.DateTimeField(db_index=True, verbose_name='Дата расчета'),
+        ),
+    ]
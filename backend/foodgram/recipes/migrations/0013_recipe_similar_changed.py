@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def clear_fresh_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(similar_stale=False).update(similar_changed=None)
+
+
+def mark_fresh_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(similar_changed__isnull=True).update(
+        similar_stale=False
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_score_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='similar_changed',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='Изменен после расчета похожих рецептов'),
+        ),
+        migrations.RunPython(clear_fresh_recipes, mark_fresh_recipes),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='similar_stale',
+        ),
+    ]
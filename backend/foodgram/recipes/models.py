@@ -1,6 +1,11 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
+from recipes.storage import recipe_image_storage
 from users.models import User
 
 MIN_COOKING_TIME = 1  # Минимальное время приготовления рецепта в минутах
@@ -23,6 +28,12 @@ class Ingredient(models.Model):
         ordering = ('name', )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -54,6 +65,42 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты рецептов фиксированным
+        числом запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            )
+        )
+
+    def latest_by_authors(self, authors, limit):
+        """Возвращает не более limit последних рецептов каждого автора
+        одним запросом с оконной функцией ROW_NUMBER."""
+        ranked = self.filter(author__in=authors).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=F('pub_date').desc()
+            )
+        ).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) AS ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -67,10 +114,27 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=recipe_image_storage,
         null=True,
         blank=True,
         default=None
     )
+    image_thumbnail = models.ImageField(
+        storage=recipe_image_storage,
+        blank=True,
+        verbose_name='Миниатюра изображения'
+    )
+    image_medium = models.ImageField(
+        storage=recipe_image_storage,
+        blank=True,
+        verbose_name='Изображение для ленты'
+    )
+    image_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name='Хэш изображения'
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
     )
@@ -97,15 +161,59 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество добавлений в избранное'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество добавлений в корзину'
+    )
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Поисковый документ'
+    )
+    similar_changed = models.DateTimeField(
+        null=True,
+        default=timezone.now,
+        db_index=True,
+        editable=False,
+        verbose_name='Изменен после расчета похожих рецептов'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_favorites_count_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.author.username}: {self.name}'
 
+    @property
+    def card_image(self):
+        return self.image_thumbnail or self.image
+
+    @property
+    def feed_image(self):
+        return self.image_medium or self.image
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -154,6 +262,10 @@ class RecipeFavorite(models.Model):
         related_name='in_favorites',
         verbose_name='Понравившиеся рецепты'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         ordering = ('id',)
@@ -183,6 +295,10 @@ class ShoppingCart(models.Model):
         related_name='in_carts',
         verbose_name='Рецепты в корзине'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         ordering = ('id',)
@@ -197,3 +313,197 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class RecipeScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.FloatField(
+        default=0,
+        verbose_name='Популярность'
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Популярность за последнее время'
+    )
+    updated = models.DateTimeField(
+        db_index=True,
+        verbose_name='Дата расчета'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popular'],
+                name='recipe_score_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending'],
+                name='recipe_score_trending_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popular:.2f}, {self.trending:.2f}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        ordering = ('-score', )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} - {self.similar_id}: {self.score:.2f}'
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe_id')
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_item_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class ExportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name='Пользователь'
+    )
+    format = models.CharField(
+        max_length=10,
+        verbose_name='Формат'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    file = models.FileField(
+        upload_to='exports/',
+        blank=True,
+        verbose_name='Файл'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Количество попыток'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Не запускать раньше'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='export_job_status_idx'
+            ),
+            models.Index(
+                fields=['status', 'run_after'],
+                name='export_job_run_after_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.format}, {self.status}'
@@ -0,0 +1,133 @@
+import time
+from collections import Counter, defaultdict
+from threading import Lock
+
+from django.conf import settings
+
+from recipes.models import RecipeIngredient
+
+
+class PantryIndex:
+    """Индекс состава рецептов в памяти процесса для подбора рецептов
+    по имеющимся ингредиентам.
+
+    Для каждого рецепта хранится отсортированный кортеж id ингредиентов,
+    для каждого ингредиента - множество рецептов, в которые он входит.
+    Запрос проходит только по рецептам с указанными ингредиентами.
+    Индекс строится при первом обращении, обновляется при сохранении
+    рецептов в этом процессе и перестраивается не реже раза в
+    PANTRY_INDEX_TTL секунд, чтобы подхватывать изменения из других
+    процессов. Перестроение идет без блокировки запросов: пока новый
+    индекс строится, запросы обслуживает прежний.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._recipes = None
+        self._ingredients = None
+        self._changed = None
+        self._built_at = 0
+
+    def _load(self, recipe_ids=None):
+        rows = RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in rows.iterator():
+            recipes[recipe_id].append(ingredient_id)
+        return recipes
+
+    @staticmethod
+    def _add(recipes, ingredients, recipe_id, ingredient_ids):
+        recipes[recipe_id] = tuple(sorted(ingredient_ids))
+        for ingredient_id in ingredient_ids:
+            ingredients[ingredient_id].add(recipe_id)
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            recipes = self._ingredients[ingredient_id]
+            recipes.discard(recipe_id)
+            if not recipes:
+                del self._ingredients[ingredient_id]
+
+    def _is_fresh(self):
+        return (
+            self._recipes is not None
+            and time.monotonic() - self._built_at < settings.PANTRY_INDEX_TTL
+        )
+
+    def _build(self):
+        """Строит новый индекс и подменяет им прежний. Рецепты, измененные
+        во время построения, перечитываются после подмены. Если индекс
+        уже строит другой поток, запрос не ждет и использует прежний."""
+        if not self._build_lock.acquire(blocking=self._recipes is None):
+            return
+        try:
+            if self._is_fresh():
+                return
+            with self._lock:
+                self._changed = set()
+            recipes = {}
+            ingredients = defaultdict(set)
+            for recipe_id, ingredient_ids in self._load().items():
+                self._add(recipes, ingredients, recipe_id, ingredient_ids)
+            with self._lock:
+                self._recipes = recipes
+                self._ingredients = ingredients
+                self._built_at = time.monotonic()
+                changed, self._changed = self._changed, None
+            if changed:
+                self.update(changed)
+        finally:
+            self._build_lock.release()
+
+    def update(self, recipe_ids):
+        """Перечитывает состав рецептов из базы данных."""
+        with self._lock:
+            if self._changed is not None:
+                self._changed.update(recipe_ids)
+            if self._recipes is None:
+                return
+        recipes = self._load(recipe_ids)
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+                if recipe_id in recipes:
+                    self._add(
+                        self._recipes,
+                        self._ingredients,
+                        recipe_id,
+                        recipes[recipe_id]
+                    )
+
+    def remove(self, recipe_id):
+        with self._lock:
+            if self._changed is not None:
+                self._changed.add(recipe_id)
+            if self._recipes is not None:
+                self._remove(recipe_id)
+
+    def match(self, ingredient_ids, min_coverage):
+        """Возвращает рецепты, ингредиенты которых есть в ingredient_ids
+        хотя бы на долю min_coverage, в виде (id рецепта, доля, число
+        недостающих ингредиентов) по убыванию доли."""
+        if not self._is_fresh():
+            self._build()
+        with self._lock:
+            hits = Counter()
+            for ingredient_id in set(ingredient_ids):
+                hits.update(self._ingredients.get(ingredient_id, ()))
+            matches = []
+            for recipe_id, count in hits.items():
+                total = len(self._recipes[recipe_id])
+                coverage = count / total
+                if coverage >= min_coverage:
+                    matches.append((recipe_id, coverage, total - count))
+        matches.sort(key=lambda match: (-match[1], match[2], -match[0]))
+        return matches
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,67 @@
+import heapq
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import RecipeFavorite, RecipeScore, ShoppingCart
+
+# Модель с действиями пользователей и вес одного действия в рейтинге.
+SCORE_SOURCES = (
+    (RecipeFavorite, 1),
+    (ShoppingCart, 2),
+)
+BATCH_SIZE = 1000  # Количество строк, читаемых и сохраняемых за раз
+SECONDS_IN_HOUR = 60 * 60
+
+
+def get_activity(model, weight):
+    """Возвращает действия с рецептами в виде (id рецепта, время, вес)
+    по возрастанию id рецепта."""
+    rows = model.objects.order_by('recipe_id').values_list(
+        'recipe_id', 'created'
+    )
+    for recipe_id, created in rows.iterator(chunk_size=BATCH_SIZE):
+        yield recipe_id, created, weight
+
+
+def get_scores(now):
+    """Считает рейтинги рецептов с экспоненциальным затуханием веса
+    действий. Действия читаются из базы данных потоком, поэтому в памяти
+    находятся только действия одного рецепта."""
+    activity = heapq.merge(
+        *(get_activity(model, weight) for model, weight in SCORE_SOURCES),
+        key=itemgetter(0)
+    )
+    for recipe_id, rows in groupby(activity, key=itemgetter(0)):
+        popular = trending = 0
+        for _, created, weight in rows:
+            age = max((now - created).total_seconds() / SECONDS_IN_HOUR, 0)
+            popular += weight * 0.5 ** (age / settings.POPULAR_HALF_LIFE)
+            trending += weight * 0.5 ** (age / settings.TRENDING_HALF_LIFE)
+        yield RecipeScore(
+            recipe_id=recipe_id,
+            popular=popular,
+            trending=trending,
+            updated=now
+        )
+
+
+def compute_recipe_scores():
+    """Пересчитывает рейтинги всех рецептов и удаляет рейтинги рецептов
+    без действий. Время расчета служит версией рейтингов для кэшей, см.
+    get_scores_version. Возвращает число рецептов с рейтингом."""
+    now = timezone.now()
+    scores = get_scores(now)
+    total = 0
+    while batch := list(islice(scores, BATCH_SIZE)):
+        RecipeScore.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=('recipe', ),
+            update_fields=('popular', 'trending', 'updated')
+        )
+        total += len(batch)
+    RecipeScore.objects.filter(updated__lt=now).delete()
+    return total
@@ -0,0 +1,246 @@
+import math
+import re
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from difflib import get_close_matches
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+SEARCH_CONFIG = 'russian'  # Конфигурация полнотекстового поиска PostgreSQL
+WORD_PATTERN = re.compile(r'\w+')
+# Вес совпадения слова запроса со словом документа по типу совпадения.
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def build_search_documents(recipe_ids):
+    """Собирает поисковые документы рецептов из названия, описания,
+    ингредиентов и тегов."""
+    recipes = Recipe.objects.filter(id__in=recipe_ids).only(
+        'id', 'name', 'text'
+    ).prefetch_related('tags', 'ingredients')
+    return {
+        recipe.id: ' '.join((
+            recipe.name,
+            *(ingredient.name for ingredient in recipe.ingredients.all()),
+            *(tag.name for tag in recipe.tags.all()),
+            recipe.text,
+        )).lower()
+        for recipe in recipes
+    }
+
+
+def update_search_documents(recipe_ids):
+    """Пересчитывает поисковые документы рецептов и после фиксации
+    транзакции обновляет индекс в памяти процесса."""
+    documents = build_search_documents(recipe_ids)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(id=recipe_id, search_document=document)
+            for recipe_id, document in documents.items()
+        ],
+        ('search_document', ),
+        batch_size=500
+    )
+    transaction.on_commit(lambda: search_index.update(documents))
+
+
+class SearchIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Используется, когда база данных не PostgreSQL. Слова запроса
+    сопоставляются со словами документов точно, по префиксу, а при
+    отсутствии таких совпадений - по похожему написанию. Рецепт должен
+    совпасть со всеми словами запроса, ранг считается по TF-IDF.
+    Индекс строится при первом обращении, обновляется при сохранении
+    рецептов в этом процессе и перестраивается не реже раза в
+    SEARCH_INDEX_TTL секунд, чтобы подхватывать изменения из других
+    процессов. Перестроение идет без блокировки запросов: пока новый
+    индекс строится, запросы обслуживает прежний.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._postings = None
+        self._documents = {}
+        self._vocabulary = None
+        self._changed = None
+        self._built_at = 0
+
+    @staticmethod
+    def _add(postings, documents, recipe_id, document):
+        terms = Counter(tokenize(document))
+        for term, count in terms.items():
+            postings[term][recipe_id] = count
+        documents[recipe_id] = terms.keys()
+
+    def _remove(self, recipe_id):
+        for term in self._documents.pop(recipe_id, ()):
+            postings = self._postings[term]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def _apply(self, documents):
+        """Применяет изменения документов; None - рецепт удален."""
+        for recipe_id, document in documents.items():
+            self._remove(recipe_id)
+            if document is not None:
+                self._add(
+                    self._postings, self._documents, recipe_id, document
+                )
+        self._vocabulary = None
+
+    def _is_fresh(self):
+        return (
+            self._postings is not None
+            and time.monotonic() - self._built_at < settings.SEARCH_INDEX_TTL
+        )
+
+    def _build(self):
+        """Строит новый индекс и подменяет им прежний. Документы,
+        измененные во время построения, применяются к новому индексу при
+        подмене. Если индекс уже строит другой поток, запрос не ждет и
+        использует прежний."""
+        if not self._build_lock.acquire(blocking=self._postings is None):
+            return
+        try:
+            if self._is_fresh():
+                return
+            with self._lock:
+                self._changed = {}
+            postings = defaultdict(dict)
+            documents = {}
+            for recipe_id, document in Recipe.objects.values_list(
+                'id', 'search_document'
+            ).iterator():
+                self._add(postings, documents, recipe_id, document)
+            with self._lock:
+                self._postings = postings
+                self._documents = documents
+                self._apply(self._changed)
+                self._changed = None
+                self._built_at = time.monotonic()
+        finally:
+            self._build_lock.release()
+
+    def update(self, documents):
+        with self._lock:
+            if self._changed is not None:
+                self._changed.update(documents)
+            if self._postings is not None:
+                self._apply(documents)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            if self._changed is not None:
+                self._changed[recipe_id] = None
+            if self._postings is not None:
+                self._apply({recipe_id: None})
+
+    def _match_terms(self, word):
+        """Возвращает слова словаря, подходящие под слово запроса,
+        с весами совпадения."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        matches = {}
+        position = bisect_left(vocabulary, word)
+        while (
+            position < len(vocabulary)
+            and vocabulary[position].startswith(word)
+        ):
+            term = vocabulary[position]
+            matches[term] = 1 if term == word else PREFIX_WEIGHT
+            position += 1
+        if not matches:
+            for term in get_close_matches(word, vocabulary, n=3, cutoff=0.75):
+                matches[term] = FUZZY_WEIGHT
+        return matches
+
+    def search(self, query, limit):
+        """Возвращает до limit id рецептов, подходящих под запрос,
+        по убыванию ранга."""
+        words = set(tokenize(query))
+        if not words:
+            return []
+        if not self._is_fresh():
+            self._build()
+        with self._lock:
+            total = len(self._documents) or 1
+            scores = None
+            for word in words:
+                word_scores = defaultdict(float)
+                for term, weight in self._match_terms(word).items():
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for recipe_id, count in postings.items():
+                        word_scores[recipe_id] += (
+                            weight * idf * count / (count + 1)
+                        )
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {
+                        recipe_id: score + word_scores[recipe_id]
+                        for recipe_id, score in scores.items()
+                        if recipe_id in word_scores
+                    }
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda recipe_id: -scores[recipe_id])[:limit]
+
+
+search_index = SearchIndex()
+
+
+def search_postgresql(queryset, query):
+    """Ищет по полнотекстовому индексу и по сходству слов pg_trgm."""
+    document = f'"{Recipe._meta.db_table}"."search_document"'
+    vector = f"to_tsvector('{SEARCH_CONFIG}', {document})"
+    ts_query = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    return queryset.filter(
+        RawSQL(
+            f'({vector} @@ {ts_query} OR %s <%% {document})',
+            (query, query),
+            output_field=BooleanField()
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f'ts_rank({vector}, {ts_query}) + '
+            f'word_similarity(%s, {document})',
+            (query, query),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def search_recipes(queryset, query):
+    """Возвращает рецепты queryset, подходящие под поисковый запрос,
+    по убыванию релевантности."""
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_postgresql(queryset, query)
+    recipe_ids = search_index.search(query, settings.SEARCH_RESULTS_LIMIT)
+    if not recipe_ids:
+        return queryset.none()
+    return queryset.filter(id__in=recipe_ids).annotate(
+        search_rank=Case(
+            *(
+                When(id=recipe_id, then=Value(-position))
+                for position, recipe_id in enumerate(recipe_ids)
+            ),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-id')
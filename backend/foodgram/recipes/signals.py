@@ -0,0 +1,178 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from recipes.counters import change_counter
+from recipes.feed import backfill_feed, fan_out_recipes, schedule_feed_update
+from recipes.images import schedule_recipe_image
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (FeedItem, Ingredient, Recipe, RecipeFavorite,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.pantry_index import pantry_index
+from recipes.search import search_index, update_search_documents
+from recipes.user_state import invalidate_user_state
+from recipes.versions import (COUNTS, INGREDIENTS, RECIPES, TAGS,
+                              bump_table_version)
+from users.models import Subscription, User
+
+# Отправляется после сохранения состава рецептов, то есть тегов и
+# ингредиентов, которые обычно создаются массово без сигналов моделей.
+recipes_updated = Signal()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+def change_recipe_counter(recipe_id, counter, delta):
+    change_counter(Recipe, recipe_id, counter, delta)
+    transaction.on_commit(lambda: bump_table_version(COUNTS))
+
+
+@receiver(post_save, sender=RecipeFavorite)
+def increase_favorites_count(instance, created, **kwargs):
+    if created:
+        change_recipe_counter(instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=RecipeFavorite)
+def decrease_favorites_count(instance, **kwargs):
+    change_recipe_counter(instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increase_carts_count(instance, created, **kwargs):
+    if created:
+        change_recipe_counter(instance.recipe_id, 'carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrease_carts_count(instance, **kwargs):
+    change_recipe_counter(instance.recipe_id, 'carts_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_renditions(instance, **kwargs):
+    """Сбрасывает копии изображения, если оно было загружено заново.
+    Старые файлы не удаляются сразу: тот же файл может сохранять
+    параллельный запрос, поэтому их удаляет команда delete_unused_images
+    по истечении --min-age."""
+    instance.image_changed = bool(
+        instance.image and not instance.image._committed
+    )
+    if instance.image_changed or not instance.image:
+        instance.image_thumbnail = ''
+        instance.image_medium = ''
+        instance.image_hash = ''
+
+
+@receiver(post_save, sender=Recipe)
+def process_image_renditions(instance, **kwargs):
+    if instance.image_changed:
+        schedule_recipe_image(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(recipes_updated, sender=Recipe)
+def update_recipe_indexes(recipe_ids, **kwargs):
+    update_search_documents(recipe_ids)
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        similar_changed=timezone.now()
+    )
+    transaction.on_commit(lambda: pantry_index.update(recipe_ids))
+    transaction.on_commit(lambda: bump_table_version(RECIPES))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_recipe_indexes(instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: search_index.remove(recipe_id))
+    transaction.on_commit(lambda: pantry_index.remove(recipe_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_related_search_documents(sender, instance, created, **kwargs):
+    """Обновляет поисковые документы рецептов после переименования
+    тега или ингредиента."""
+    if created:
+        return
+    recipe_ids = list(
+        Recipe.objects.filter(
+            **{'tags' if sender is Tag else 'ingredients': instance}
+        ).values_list('id', flat=True)
+    )
+    transaction.on_commit(lambda: update_search_documents(recipe_ids))
+
+
+@receiver(post_save, sender=Subscription)
+def increase_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrease_followers_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        schedule_feed_update(fan_out_recipes, [instance.id])
+
+
+@receiver(post_save, sender=Subscription)
+def fill_feed(instance, created, **kwargs):
+    if created:
+        schedule_feed_update(
+            backfill_feed, instance.user_id, instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_feed(instance, **kwargs):
+    FeedItem.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).delete()
+
+
+@receiver((post_save, post_delete), sender=RecipeFavorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def reset_user_state(instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_state(user_id))
+
+
+# Версии меняются только после фиксации транзакции: иначе читатель
+# может закэшировать под новой версией еще не записанные данные.
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    transaction.on_commit(lambda: bump_table_version(TAGS, RECIPES))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    transaction.on_commit(lambda: bump_table_version(INGREDIENTS, RECIPES))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=User)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(**kwargs):
+    transaction.on_commit(lambda: bump_table_version(RECIPES))
@@ -0,0 +1,189 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+# Ингредиенты и теги, которые встречаются в большем числе рецептов,
+# не используются для отбора кандидатов, но учитываются в сходстве.
+MAX_CANDIDATES_PER_FEATURE = 1000
+BATCH_SIZE = 500  # Количество рецептов, сохраняемых за раз
+
+
+class SimilarityIndex:
+    """Разреженные векторы рецептов для поиска похожих.
+
+    Признаки рецепта - id его ингредиентов и id тегов со знаком минус,
+    вес признака - IDF. Сходство считается косинусной мерой между
+    рецептами, у которых есть хотя бы один общий редкий признак.
+    """
+
+    def __init__(self):
+        self.features = defaultdict(set)
+        rows = RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=BATCH_SIZE):
+            self.features[recipe_id].add(ingredient_id)
+        rows = Recipe.tags.through.objects.values_list('recipe_id', 'tag_id')
+        for recipe_id, tag_id in rows.iterator(chunk_size=BATCH_SIZE):
+            self.features[recipe_id].add(-tag_id)
+        self.postings = defaultdict(list)
+        for recipe_id, features in self.features.items():
+            for feature in features:
+                self.postings[feature].append(recipe_id)
+        self.common_postings = {
+            feature: set(recipes)
+            for feature, recipes in self.postings.items()
+            if len(recipes) > MAX_CANDIDATES_PER_FEATURE
+        }
+        total = len(self.features)
+        self.weights = {
+            feature: math.log(1 + total / len(recipes)) ** 2
+            for feature, recipes in self.postings.items()
+        }
+        self.norms = {
+            recipe_id: math.sqrt(sum(self.weights[f] for f in features))
+            for recipe_id, features in self.features.items()
+        }
+
+    def get_dot_products(self, features):
+        """Считает скалярные произведения с рецептами, у которых есть общие
+        редкие признаки. Частые признаки добавляются только к уже
+        найденным кандидатам."""
+        rare = [
+            feature for feature in features
+            if len(self.postings[feature]) <= MAX_CANDIDATES_PER_FEATURE
+        ]
+        if not rare and features:
+            rarest = min(features, key=lambda f: len(self.postings[f]))
+            candidates = self.postings[rarest][:MAX_CANDIDATES_PER_FEATURE]
+            return {
+                candidate: sum(
+                    self.weights[feature]
+                    for feature in features & self.features[candidate]
+                )
+                for candidate in candidates
+            }
+        products = defaultdict(float)
+        for feature in rare:
+            weight = self.weights[feature]
+            for candidate in self.postings[feature]:
+                products[candidate] += weight
+        for feature in features.difference(rare):
+            weight = self.weights[feature]
+            for candidate in products.keys() & self.common_postings[feature]:
+                products[candidate] += weight
+        return products
+
+    def get_similar(self, recipe_id, count):
+        """Возвращает до count пар (id рецепта, сходство) по убыванию
+        сходства."""
+        features = self.features.get(recipe_id, set())
+        products = self.get_dot_products(features)
+        products.pop(recipe_id, None)
+        norm = self.norms.get(recipe_id)
+        return heapq.nlargest(
+            count,
+            (
+                (candidate, product / (norm * self.norms[candidate]))
+                for candidate, product in products.items()
+            ),
+            key=lambda item: item[1]
+        )
+
+
+def get_affected_recipes(similar):
+    """Возвращает рецепты, списки похожих которых могли измениться из-за
+    пересчета списков similar: ссылающиеся на пересчитанные рецепты и те,
+    в чьи списки они теперь попадают."""
+    affected = set(
+        SimilarRecipe.objects.filter(
+            similar__in=similar
+        ).values_list('recipe_id', flat=True)
+    )
+    candidates = {}
+    for neighbours in similar.values():
+        for candidate, score in neighbours:
+            candidates[candidate] = max(score, candidates.get(candidate, 0))
+    lists = SimilarRecipe.objects.filter(
+        recipe__in=candidates
+    ).order_by().values('recipe_id').annotate(
+        count=Count('id'), min_score=Min('score')
+    )
+    full = {
+        row['recipe_id']: row['min_score'] for row in lists
+        if row['count'] >= settings.SIMILAR_RECIPES_COUNT
+    }
+    affected.update(
+        candidate for candidate, score in candidates.items()
+        if candidate not in full or score > full[candidate]
+    )
+    return affected - similar.keys()
+
+
+@transaction.atomic
+def save_similar(similar, started):
+    """Сохраняет списки похожих рецептов. Отметка об изменении снимается
+    только с рецептов, не менявшихся после начала расчета started."""
+    SimilarRecipe.objects.filter(recipe__in=similar).delete()
+    SimilarRecipe.objects.bulk_create(
+        (
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+            for recipe_id, neighbours in similar.items()
+            for other, score in neighbours
+        ),
+        batch_size=BATCH_SIZE
+    )
+    Recipe.objects.filter(
+        id__in=similar, similar_changed__lte=started
+    ).update(similar_changed=None)
+
+
+def update_similar(index, recipe_ids, started):
+    recipe_ids = iter(recipe_ids)
+    count = settings.SIMILAR_RECIPES_COUNT
+    while batch := list(islice(recipe_ids, BATCH_SIZE)):
+        save_similar(
+            {
+                recipe_id: index.get_similar(recipe_id, count)
+                for recipe_id in batch
+            },
+            started
+        )
+
+
+def build_similar_recipes(full=False):
+    """Пересчитывает похожие рецепты для всех рецептов или только для
+    измененных с прошлого запуска и затронутых ими. Если изменено больше
+    BATCH_SIZE рецептов, пересчитываются все. Возвращает число
+    пересчитанных рецептов. Рецепты, измененные во время расчета,
+    останутся отмеченными до следующего запуска."""
+    started = timezone.now()
+    stale = list(
+        Recipe.objects.filter(
+            similar_changed__isnull=False
+        ).values_list('id', flat=True)
+    )
+    if not full and not stale:
+        return 0
+    index = SimilarityIndex()
+    if full or len(stale) > BATCH_SIZE:
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        update_similar(index, recipe_ids, started)
+        return len(recipe_ids)
+    count = settings.SIMILAR_RECIPES_COUNT
+    similar = {
+        recipe_id: index.get_similar(recipe_id, count)
+        for recipe_id in stale
+    }
+    affected = get_affected_recipes(similar)
+    save_similar(similar, started)
+    update_similar(index, affected, started)
+    return len(similar) + len(affected)
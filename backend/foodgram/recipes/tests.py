@@ -0,0 +1,185 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from recipes.ingredient_index import IngredientIndex, ingredient_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.pantry_index import PantryIndex
+from recipes.search import SearchIndex, update_search_documents
+from recipes.similar import build_similar_recipes, save_similar
+from recipes.storage import ContentAddressedStorage
+from users.models import User
+
+
+def create_recipes(count):
+    author = User.objects.create_user(
+        email='author@example.com',
+        username='author',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password'
+    )
+    return Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+               cooking_time=10)
+        for number in range(count)
+    )
+
+
+class SimilarRecipesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(3)
+
+    def get_changed(self):
+        return set(
+            Recipe.objects.filter(
+                similar_changed__isnull=False
+            ).values_list('id', flat=True)
+        )
+
+    def test_build_clears_changed_recipes(self):
+        self.assertEqual(build_similar_recipes(), len(self.recipes))
+        self.assertEqual(self.get_changed(), set())
+        self.assertEqual(build_similar_recipes(), 0)
+
+    def test_recipe_changed_during_build_stays_changed(self):
+        started = timezone.now() - timedelta(minutes=1)
+        changed, unchanged = self.recipes[:2]
+        Recipe.objects.filter(id=unchanged.id).update(
+            similar_changed=started - timedelta(minutes=1)
+        )
+        save_similar({changed.id: [], unchanged.id: []}, started)
+        self.assertEqual(self.get_changed(), {changed.id, self.recipes[2].id})
+
+
+class PantryIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(2)
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in cls.recipes
+            for ingredient in cls.ingredients[:2]
+        )
+
+    def test_match(self):
+        index = PantryIndex()
+        matches = index.match([self.ingredients[0].id], 0.5)
+        self.assertEqual(
+            matches,
+            [(recipe.id, 0.5, 1) for recipe in reversed(self.recipes)]
+        )
+
+    def test_recipe_changed_during_build(self):
+        index = PantryIndex()
+        changed = self.recipes[0]
+        load = index._load
+
+        def load_and_change(recipe_ids=None):
+            rows = load(recipe_ids)
+            if recipe_ids is None:
+                # Рецепт изменился после того, как строящийся индекс
+                # прочитал его состав.
+                RecipeIngredient.objects.filter(
+                    recipe=changed, ingredient=self.ingredients[0]
+                ).update(ingredient=self.ingredients[2])
+                index.update([changed.id])
+            return rows
+
+        with mock.patch.object(index, '_load', load_and_change):
+            matches = index.match([self.ingredients[0].id], 0.5)
+        self.assertEqual(matches, [(self.recipes[1].id, 0.5, 1)])
+
+
+class SearchIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(2)
+        for recipe, document in zip(cls.recipes, ('борщ', 'блины')):
+            Recipe.objects.filter(id=recipe.id).update(
+                search_document=document
+            )
+
+    def test_search(self):
+        index = SearchIndex()
+        self.assertEqual(index.search('борщ', 10), [self.recipes[0].id])
+        self.assertEqual(index.search('бли', 10), [self.recipes[1].id])
+
+    def test_document_changed_during_build(self):
+        index = SearchIndex()
+        changed, removed = self.recipes
+        add = index._add
+
+        def add_and_change(*args):
+            add(*args)
+            if index._changed is not None and not index._changed:
+                # Документы изменились, пока строился новый индекс.
+                index.update({changed.id: 'щи'})
+                index.remove(removed.id)
+
+        with mock.patch.object(index, '_add', add_and_change):
+            index.search('борщ', 10)
+        self.assertEqual(index.search('борщ', 10), [])
+        self.assertEqual(index.search('щи', 10), [changed.id])
+        self.assertEqual(index.search('блины', 10), [])
+
+    def test_index_is_updated_after_commit(self):
+        recipe_ids = [recipe.id for recipe in self.recipes]
+        with mock.patch('recipes.search.search_index.update') as update:
+            with self.captureOnCommitCallbacks() as callbacks:
+                update_search_documents(recipe_ids)
+            update.assert_not_called()
+            for callback in callbacks:
+                callback()
+        update.assert_called_once()
+        self.assertEqual(set(update.call_args.args[0]), set(recipe_ids))
+
+
+class IngredientIndexTest(TestCase):
+
+    def search(self, index, query):
+        return [row['name'] for row in index.search(query, 10)]
+
+    def test_loaded_ingredients_are_found(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        # Индекс другого процесса видит загрузку только по версии.
+        other_index = IngredientIndex()
+        for index in (ingredient_index, other_index):
+            self.assertEqual(self.search(index, 'сах'), [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'ingredients.csv'
+            path.write_text(
+                'name,measurement_unit\nсахар,г\n', encoding='utf-8'
+            )
+            call_command('load_ingredients', path, stdout=io.StringIO())
+        for index in (ingredient_index, other_index):
+            self.assertEqual(self.search(index, 'сах'), ['сахар'])
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def test_reused_file_is_touched(self):
+        with tempfile.TemporaryDirectory() as location:
+            storage = ContentAddressedStorage(location=location)
+            name = storage.save('images/a.jpg', ContentFile(b'image'))
+            os.utime(storage.path(name), (0, 0))
+            self.assertEqual(
+                storage.save('images/b.jpg', ContentFile(b'image')), name
+            )
+            self.assertGreater(os.path.getmtime(storage.path(name)), 0)
@@ -0,0 +1,80 @@
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import RecipeFavorite, ShoppingCart
+from recipes.versions import version_cache
+from users.models import Subscription
+
+UserState = namedtuple('UserState', ('favorites', 'carts', 'following'))
+EMPTY_USER_STATE = UserState(frozenset(), frozenset(), frozenset())
+
+
+def get_generation_key(user_id):
+    return f'user-state-generation:{user_id}'
+
+
+def get_generation(user_id):
+    """Возвращает текущее поколение состояния пользователя. Если его нет
+    в кэше, создается новое."""
+    key = get_generation_key(user_id)
+    generation = version_cache.get(key)
+    if generation is None:
+        version_cache.add(key, uuid.uuid4().hex, None)
+        generation = version_cache.get(key)
+    return generation
+
+
+def get_cache_key(user_id, generation):
+    return f'user-state:{user_id}:{generation}'
+
+
+def load_user_state(user):
+    """Возвращает id избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь, из кэша или из базы.
+
+    Состояние кэшируется под ключом текущего поколения, прочитанного до
+    запроса к базе. Если пользователь изменил данные, пока запрос
+    выполнялся, поколение уже сменилось, и устаревшее состояние
+    сохранится под ключом, который больше не читается."""
+    if user.is_anonymous:
+        return EMPTY_USER_STATE
+    key = get_cache_key(user.id, get_generation(user.id))
+    state = cache.get(key)
+    if state is None:
+        state = UserState(
+            frozenset(
+                RecipeFavorite.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)
+            ),
+            frozenset(
+                ShoppingCart.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)
+            ),
+            frozenset(
+                Subscription.objects.filter(
+                    user=user
+                ).values_list('author_id', flat=True)
+            ),
+        )
+        cache.set(key, state, settings.USER_STATE_CACHE_TTL)
+    return state
+
+
+def get_user_state(request):
+    """Загружает состояние пользователя один раз за запрос."""
+    if request is None:
+        return EMPTY_USER_STATE
+    if not hasattr(request, 'user_state'):
+        request.user_state = load_user_state(request.user)
+    return request.user_state
+
+
+def invalidate_user_state(user_id):
+    """Начинает новое поколение состояния пользователя. Вызывается после
+    фиксации транзакции с изменением его данных."""
+    version_cache.set(get_generation_key(user_id), uuid.uuid4().hex, None)
@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.utils.connection import ConnectionProxy
+
+from recipes.models import RecipeScore
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+# Счетчики избранного и корзин меняются через update() без сигналов
+# модели рецепта, поэтому у них своя версия.
+COUNTS = 'counts'
+
+# Кэш, из которого версии не вытесняются при переполнении.
+version_cache = ConnectionProxy(caches, 'versions')
+
+
+def get_cache_key(table):
+    return f'table-version:{table}'
+
+
+def bump_table_version(*tables):
+    """Отмечает изменение данных: новая версия - случайный токен и время
+    изменения."""
+    version = (uuid.uuid4().hex, int(time.time()))
+    version_cache.set_many(
+        {get_cache_key(table): version for table in tables},
+        settings.TABLE_VERSION_CACHE_TTL
+    )
+    return version
+
+
+def get_table_version(table):
+    """Возвращает (токен, время изменения) для набора данных без обращения
+    к базе. Если версия вытеснена из кэша, создается новая."""
+    version = version_cache.get(get_cache_key(table))
+    if version is None:
+        version = bump_table_version(table)
+    return version
+
+
+def get_scores_version():
+    """Возвращает (токен, время расчета) рейтингов рецептов. Рейтинги
+    пересчитывает отдельный процесс, поэтому версия берется из базы
+    данных: кэш процесса веб-сервера может не видеть его изменений."""
+    updated = RecipeScore.objects.aggregate(updated=Max('updated'))['updated']
+    if updated is None:
+        return '', 0
+    return updated.isoformat(), int(updated.timestamp())